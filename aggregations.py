@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+
+# Generator-basierte Aggregationen: jeder Block wird verarbeitet und verworfen,
+# der Speicherbedarf hängt von der Blockgröße ab, nicht von der Ergebnisgröße
+
+
+def hourly_order_counts(chunks, date_index=1):
+    # chunks: Blöcke von Zeilen (z.B. aus Database.stream), date_index: Spalte mit dem Bestellzeitpunkt
+    counts = np.zeros(24, dtype=np.int64)
+    for rows in chunks:
+        hours = np.fromiter((row[date_index].hour for row in rows if row[date_index] is not None), dtype=np.int64)
+        counts += np.bincount(hours, minlength=24)
+    return pd.DataFrame({'orderdate': np.arange(24), 'count': counts})
+
@@ -2,11 +2,24 @@ import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 import psycopg2 as pg
+from profiling import init_profiling
+from exports import init_exports
+from serialization import init_serialization
+import warmup
 
 # Initialisiere die Dash-App
 app = dash.Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME])
 server = app.server
 
+# Opt-in Profiling für Callbacks (DASH_PROFILING=1)
+init_profiling(server)
+
+# Datenexport unter /_export/<name> (CSV/Parquet, gestreamt)
+init_exports(server)
+
+# orjson/Typed Arrays für Figuren, gzip/brotli für Antworten, Messwerte unter /_serialization
+init_serialization(server)
+
 # Layout für die Dash-Anwendung
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),  # dcc.Location-Komponente hinzufügen
@@ -23,5 +36,8 @@ app.layout = html.Div([
     dash.page_container  # Platzhalter für den Inhalt der Seiten
 ])
 
+# Seitendaten im Hintergrund vorladen, der Server startet sofort
+warmup.init_warmup(server, 'app')
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,38 @@
+// Download-Links für /_export/<name>: die Adresse folgt den aktuellen Filtern, ohne Server-Roundtrip
+(function () {
+    var links = function (name, params) {
+        var query = [];
+        Object.keys(params).forEach(function (key) {
+            [].concat(params[key] === null || params[key] === undefined ? [] : params[key]).forEach(function (value) {
+                query.push(encodeURIComponent(key) + '=' + encodeURIComponent(value));
+            });
+        });
+        var base = '/_export/' + name + '?' + query.join('&');
+        return [base + '&format=csv', base + '&format=parquet'];
+    };
+    var day = function (date) {
+        return date ? String(date).slice(0, 10) : null;
+    };
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        exports: {
+            storeSales: function (startDate, endDate, cities) {
+                return links('store_sales', {start_date: day(startDate), end_date: day(endDate), city: cities});
+            },
+
+            orders: function (startDate, endDate) {
+                return links('orders', {start_date: day(startDate), end_date: day(endDate)});
+            },
+
+            frontendSales: function (storeIds, startDate, endDate, granularity) {
+                return links('sales', {store: storeIds, start_date: day(startDate), end_date: day(endDate),
+                                       granularity: granularity});
+            },
+
+            clusterExpenses: function (cluster, years) {
+                return links('cluster_expenses', {cluster: cluster, year_from: years && years[0],
+                                                  year_to: years && years[1]});
+            }
+        }
+    });
+})();
@@ -0,0 +1,20 @@
+// Clientside callbacks for Frontend.py: layout-only interactions without a server round-trip
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    frontend: {
+        toggleModal: function (n1, n2, isOpen) {
+            if (n1 || n2) {
+                return !isOpen;
+            }
+            return isOpen;
+        },
+
+        fullscreenFigure: function (isOpen, figure) {
+            if (!isOpen || !figure) {
+                return window.dash_clientside.no_update;
+            }
+            // Drop the fixed height so the figure fills the 90vh modal body
+            var layout = Object.assign({}, figure.layout, {height: null, autosize: true});
+            return Object.assign({}, figure, {layout: layout});
+        }
+    }
+});
@@ -0,0 +1,10 @@
+// Live-Modus: das Abfrageintervall läuft nur, solange der Schalter aktiv ist
+(function () {
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {
+            toggleInterval: function (value) {
+                return !(value && value.length);
+            }
+        }
+    });
+})();
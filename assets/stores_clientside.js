@@ -0,0 +1,165 @@
+// Clientseitige Callbacks der Stores-Seite: Umgruppieren und Drill-down ohne Server-Roundtrip
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    stores: {
+        selectCity: function (mapClick, selectedCities, salesData) {
+            if (!mapClick || !salesData) {
+                return window.dash_clientside.no_update;
+            }
+            var storeId = mapClick.points[0].hovertext;
+            var city = salesData.store_cities[storeId];
+            var cities = (selectedCities || []).slice();
+            if (city && cities.indexOf(city) === -1) {
+                cities.push(city);
+            }
+            return cities;
+        },
+
+        updateZoom: function (clickOrders, clickCustomers, granularity, resetClicks, salesData, zoom) {
+            var triggered = window.dash_clientside.callback_context.triggered.map(function (t) {
+                return t.prop_id;
+            });
+            var click = null;
+            if (triggered.indexOf('sales-bar-chart-orders.clickData') !== -1) {
+                click = clickOrders;
+            } else if (triggered.indexOf('sales-bar-chart-customers.clickData') !== -1) {
+                click = clickCustomers;
+            } else {
+                // Neue Daten, andere Granularität oder Reset heben den Zoom auf
+                return null;
+            }
+            if (zoom || granularity !== 'month' || !click) {
+                return window.dash_clientside.no_update;
+            }
+            return click.points[0].x;
+        },
+
+        renderSalesCharts: function (salesData, selectedCities, granularity, zoom) {
+            var ordersTitle = 'Number of Orders Over Time';
+            var customersTitle = 'Number of Customers Over Time';
+            var emptyFigure = function (title) {
+                return {data: [], layout: {title: {text: title}, barmode: 'group', xaxis: {type: 'category'}}};
+            };
+            if (!salesData || !selectedCities || selectedCities.length === 0) {
+                return [{}, {}];
+            }
+
+            var binOf = function (date) {
+                if (zoom || granularity === 'day') {
+                    return date;
+                }
+                if (granularity === 'week') {
+                    // Wochenbeginn (Montag) als Bin
+                    var d = new Date(date + 'T00:00:00Z');
+                    d.setUTCDate(d.getUTCDate() - (d.getUTCDay() + 6) % 7);
+                    return d.toISOString().slice(0, 10);
+                }
+                return date.slice(0, 7);
+            };
+
+            // Bins pro Datum einmal berechnen, beim Zoom nur die Tage des Monats
+            var bins = [];
+            var binIndex = {};
+            var dateBins = salesData.dates.map(function (date) {
+                if (zoom && date.slice(0, 7) !== zoom) {
+                    return -1;
+                }
+                var bin = binOf(date);
+                if (!(bin in binIndex)) {
+                    binIndex[bin] = bins.length;
+                    bins.push(bin);
+                }
+                return binIndex[bin];
+            });
+
+            var byCity = {};
+            Object.keys(salesData.stores).forEach(function (storeId) {
+                var store = salesData.stores[storeId];
+                if (selectedCities.indexOf(store.city) === -1) {
+                    return;
+                }
+                if (!byCity[store.city]) {
+                    byCity[store.city] = {orders: new Array(bins.length).fill(0)};
+                }
+                var target = byCity[store.city];
+                for (var i = 0; i < dateBins.length; i++) {
+                    if (dateBins[i] >= 0) {
+                        target.orders[dateBins[i]] += store.orders[i];
+                    }
+                }
+            });
+
+            // Eindeutige Kunden kommen pro Stadt und Granularität vom Server (nicht summierbar)
+            var customerCounts = (salesData.customers && salesData.customers.counts) || {};
+            var countsByBin = customerCounts[zoom ? 'day' : granularity] || {};
+            Object.keys(byCity).forEach(function (city) {
+                var counts = countsByBin[city] || {};
+                byCity[city].customers = bins.map(function (bin) {
+                    return counts[bin] || 0;
+                });
+            });
+            var customerError = salesData.customers ? salesData.customers.error : 0;
+            if (customerError) {
+                customersTitle += ' (estimated, ±' + (100 * customerError).toFixed(1) + '%)';
+            }
+
+            var cities = Object.keys(byCity).sort();
+            if (cities.length === 0) {
+                return [emptyFigure(ordersTitle), emptyFigure(customersTitle)];
+            }
+
+            // Prognose der Bestellungen im Anschluss an die Daten, gleiche Bins wie die Balken
+            var forecastTraces = [];
+            var forecast = salesData.forecast;
+            if (forecast && !zoom) {
+                var forecastBins = [];
+                var forecastIndex = {};
+                var forecastDateBins = forecast.dates.map(function (date) {
+                    var bin = binOf(date);
+                    if (!(bin in forecastIndex)) {
+                        forecastIndex[bin] = forecastBins.length;
+                        forecastBins.push(bin);
+                    }
+                    return forecastIndex[bin];
+                });
+                var forecastByCity = {};
+                Object.keys(forecast.stores).forEach(function (storeId) {
+                    var city = salesData.store_cities[storeId];
+                    if (!byCity[city]) {
+                        return;
+                    }
+                    if (!forecastByCity[city]) {
+                        forecastByCity[city] = new Array(forecastBins.length).fill(0);
+                    }
+                    forecast.stores[storeId].forEach(function (value, i) {
+                        forecastByCity[city][forecastDateBins[i]] += value;
+                    });
+                });
+                forecastTraces = cities.filter(function (city) {
+                    return forecastByCity[city];
+                }).map(function (city) {
+                    return {type: 'scatter', mode: 'lines+markers', line: {dash: 'dot'},
+                            name: city + ' (forecast)', x: forecastBins, y: forecastByCity[city]};
+                });
+            }
+
+            var xTitle = (zoom || granularity === 'day') ? 'Day' : (granularity === 'week' ? 'Week' : 'Month');
+            var figure = function (key, title, yTitle) {
+                var bars = cities.map(function (city) {
+                    return {type: 'bar', name: city, x: bins, y: byCity[city][key]};
+                });
+                return {
+                    data: key === 'orders' ? bars.concat(forecastTraces) : bars,
+                    layout: {
+                        title: {text: title},
+                        barmode: 'group',
+                        xaxis: {type: 'category', title: {text: xTitle}},
+                        yaxis: {title: {text: yTitle}},
+                        legend: {title: {text: 'City'}}
+                    }
+                };
+            };
+            return [figure('orders', ordersTitle, 'Sales Count'),
+                    figure('customers', customersTitle, 'Customer Count')];
+        }
+    }
+});
@@ -0,0 +1,62 @@
+import os
+import sys
+from functools import wraps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dash
+from dash import Input, Output, State, dcc, html
+
+from callback_audit import find_layout_only_callbacks
+from cancellation import TAB_STORE, cancellable, tab_store
+
+# Prüft callback_audit an einer kleinen App mit @cancellable-Callbacks: der Wrapper darf weder die
+# Erkennung der Datenzugriffe noch den gemeldeten Namen verdecken, auch nicht unter weiteren Dekoratoren.
+#
+#   python benchmarks/callback_audit_check.py
+#
+# Exit-Code 1, sobald eine Prüfung fehlschlägt.
+
+# Nur der Name zählt für das Audit, eine Verbindung wird nie aufgebaut
+db = None
+
+
+def timed(func):
+    # Steht für weitere Dekoratoren zwischen @callback und der Funktion (z.B. Profiling)
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+app = dash.Dash(__name__)
+app.layout = html.Div([tab_store(), dcc.Input(id='value'), html.Div(id='data'), html.Div(id='panel')])
+
+
+@app.callback(Output('data', 'children'), Input('value', 'value'), State(TAB_STORE, 'data'))
+@cancellable
+@timed
+def load_rows(value):
+    with db.cursor() as cursor:
+        cursor.execute("SELECT %s;", (value,))
+        return str(cursor.fetchone())
+
+
+@app.callback(Output('panel', 'style'), Input('value', 'value'), State(TAB_STORE, 'data'))
+@cancellable
+@timed
+def toggle_panel(value):
+    return {'display': 'block' if value else 'none'}
+
+
+if __name__ == '__main__':
+    names = [name for name, _ in find_layout_only_callbacks(app)]
+    failures = []
+    if 'load_rows' in names:
+        failures.append("load_rows liest Daten, wurde aber als reiner Layout-Callback gemeldet")
+    if 'toggle_panel' not in names:
+        failures.append(f"toggle_panel ändert nur das Layout, gemeldet wurden aber {names}")
+    for failure in failures:
+        print(f"FEHLER {failure}")
+    print(f"{len(failures)} Fehler")
+    sys.exit(1 if failures else 0)
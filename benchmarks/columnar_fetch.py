@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from db import Database, copy_to_frame, pa
+
+# Vergleicht den zeilenweisen Abruf (fetchall -> pd.DataFrame -> pd.to_datetime) mit dem spaltenweisen
+# COPY-Abruf aus db.copy_to_frame, den segments.py, catchment.py, forecasting.py und sketches.py nutzen:
+#
+#   python benchmarks/columnar_fetch.py --dsn "dbname=pizzeria_load user=postgres"
+#
+# Gelesen werden dieselben Tabellen wie in segments.build_segment_dataset.
+
+TABLES = {
+    'customers': (),
+    'orders': ('orderdate',),
+    'orders_items': (),
+    'products': (),
+}
+
+
+def row_wise(connection, table, parse_dates):
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT * FROM {table}")
+        columns = [column.name for column in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        cursor.close()
+    for column in parse_dates:
+        df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def column_wise(connection, table, parse_dates):
+    return copy_to_frame(connection, f"SELECT * FROM {table}", parse_dates=parse_dates)
+
+
+def measure(func, connection, table, parse_dates, repeat):
+    # Bestwert der Laufzeit, Speicher-Peak aus einem eigenen Lauf (tracemalloc bremst)
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = func(connection, table, parse_dates)
+        durations.append(time.perf_counter() - started)
+        connection.rollback()
+    tracemalloc.start()
+    func(connection, table, parse_dates)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    connection.rollback()
+    return len(df), min(durations), peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    database = Database(dsn=args.dsn)
+    print(f"Spaltenweise über {'pyarrow' if pa is not None else 'pandas read_csv'}")
+    with database.connection() as connection:
+        for table, parse_dates in TABLES.items():
+            rows, row_seconds, row_peak = measure(row_wise, connection, table, parse_dates, args.repeat)
+            _, column_seconds, column_peak = measure(column_wise, connection, table, parse_dates, args.repeat)
+            print(f"{table:<12} {rows:>10} Zeilen   zeilenweise {row_seconds:6.2f} s / {row_peak / 2 ** 20:7.1f} MB"
+                  f"   COPY {column_seconds:6.2f} s / {column_peak / 2 ** 20:7.1f} MB"
+                  f"   Faktor {row_seconds / column_seconds:4.1f}x")
@@ -0,0 +1,62 @@
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from serialization import figure_to_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vergleicht Serialisierungszeit und Größe der Callback-Figuren: plotly-Standard-Encoder gegen
+# orjson mit Typed Arrays, jeweils unkomprimiert, gzip und (falls installiert) brotli.
+# Die Figuren entsprechen update_cluster_graphs (scatter_mapbox über alle Kunden) und den Balkendiagrammen.
+
+
+def cluster_map(customers):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'latitude': rng.uniform(33, 42, customers), 'longitude': rng.uniform(-124, -114, customers),
+                       'cluster': pd.Categorical(rng.integers(0, 3, customers), categories=[0, 1, 2])})
+    return px.scatter_mapbox(df, lat='latitude', lon='longitude', color='cluster', mapbox_style="open-street-map",
+                             zoom=5, height=300)
+
+
+def sales_bars(days):
+    rng = np.random.default_rng(1)
+    dates = pd.date_range('2020-01-01', periods=days)
+    df = pd.DataFrame({'date': np.tile(dates, 5), 'city': np.repeat([f'City {i}' for i in range(5)], days),
+                       'orders': rng.integers(0, 400, days * 5)})
+    return px.bar(df, x='date', y='orders', color='city', barmode='group')
+
+
+def measure(label, serialize, fig, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = serialize(fig).encode()
+    duration = (time.perf_counter() - started) / repeat
+    sizes = [f"{len(payload) / 1024:9.1f}", f"{len(gzip.compress(payload, 6)) / 1024:9.1f}"]
+    sizes.append(f"{len(brotli.compress(payload, quality=5)) / 1024:9.1f}" if brotli else f"{'-':>9}")
+    print(f"{label:<28} {duration * 1000:8.1f} ms {'  '.join(sizes)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=1095)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'':<28} {'Zeit':>11} {'roh KB':>9}  {'gzip KB':>9}  {'brotli KB':>9}")
+    for name, fig in [('cluster map', cluster_map(args.customers)), ('sales bars', sales_bars(args.days))]:
+        measure(f"{name}, plotly json", lambda f: pio.to_json(f, validate=False, engine='json'), fig, args.repeat)
+        measure(f"{name}, orjson+typed", figure_to_json, fig, args.repeat)
@@ -0,0 +1,166 @@
+import argparse
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from catchment import refresh_catchment
+from copurchase import build_or_update
+from db import Database
+from ingest import apply_migrations, copy_frame, load_orders
+
+# Füllt eine leere Postgres-Datenbank mit synthetischen Stores, Produkten, Kunden und Bestellungen
+# im Schema der Dashboards, z.B. für den Lasttest (benchmarks/load_test.py):
+#
+#   createdb pizzeria_load
+#   python benchmarks/generate_data.py --dsn "dbname=pizzeria_load user=postgres" --orders 2000000
+#
+# Die Bestellungen laufen monatsweise durch ingest.load_orders, Partitionen, Kundenkennzahlen und
+# Tagesskizzen entstehen also wie im Betrieb.
+
+BASE_SCHEMA = """
+              CREATE TABLE IF NOT EXISTS customers (
+                  customerid VARCHAR(255) PRIMARY KEY,
+                  latitude   FLOAT,
+                  longitude  FLOAT
+              );
+              CREATE TABLE IF NOT EXISTS products (
+                  sku         VARCHAR(255) PRIMARY KEY,
+                  name        VARCHAR(255),
+                  price       FLOAT,
+                  category    VARCHAR(255),
+                  size        VARCHAR(255),
+                  ingredients VARCHAR(255),
+                  launch      DATE
+              );
+              CREATE TABLE IF NOT EXISTS stores (
+                  storeid    VARCHAR(255) PRIMARY KEY,
+                  zipcode    VARCHAR(255),
+                  state_abbr VARCHAR(255),
+                  latitude   FLOAT,
+                  longitude  FLOAT,
+                  city       VARCHAR(255),
+                  state      VARCHAR(255),
+                  distance   FLOAT
+              );
+              -- Ausgangstabellen für migrations/001_partition_orders.sql
+              CREATE TABLE IF NOT EXISTS orders (
+                  orderid    VARCHAR(255) PRIMARY KEY,
+                  customerid VARCHAR(255),
+                  storeid    VARCHAR(255),
+                  orderdate  TIMESTAMP,
+                  nitems     INT,
+                  total      FLOAT
+              );
+              CREATE TABLE IF NOT EXISTS orderitems (
+                  orderid VARCHAR(255),
+                  sku     VARCHAR(255)
+              );
+              """
+
+CITIES = [
+    ('Los Angeles', 'CA', 'California', 34.05, -118.24), ('San Diego', 'CA', 'California', 32.72, -117.16),
+    ('San Francisco', 'CA', 'California', 37.77, -122.42), ('Sacramento', 'CA', 'California', 38.58, -121.49),
+    ('Las Vegas', 'NV', 'Nevada', 36.17, -115.14), ('Phoenix', 'AZ', 'Arizona', 33.45, -112.07),
+    ('Salt Lake City', 'UT', 'Utah', 40.76, -111.89), ('Denver', 'CO', 'Colorado', 39.74, -104.99),
+]
+PIZZAS = ['Margherita', 'Pepperoni', 'Hawaiian', 'Veggie', 'BBQ Chicken', 'Buffalo Chicken',
+          'Meat Lover', 'Sicilian', 'Oxtail', 'Vegan']
+SIZES = {'Small': 0.8, 'Medium': 1.0, 'Large': 1.25, 'Extra Large': 1.5}
+# Relative Häufigkeit je Uhrzeit (UTC, die Dashboards verschieben um 9 Stunden)
+HOUR_WEIGHTS = np.roll(np.array([1, 1, 1, 1, 1, 1, 2, 3, 4, 5, 8, 14, 16, 10, 7, 7, 9, 14, 18, 16, 11, 6, 3, 2],
+                                dtype=float), 9)
+
+
+def generate_dimensions(rng, stores_per_city, customers_per_store):
+    stores, customers = [], []
+    for city, state_abbr, state, latitude, longitude in CITIES:
+        for _ in range(stores_per_city):
+            store_id = f"S{len(stores):06d}"
+            store_latitude = latitude + rng.normal(0, 0.1)
+            store_longitude = longitude + rng.normal(0, 0.1)
+            stores.append((store_id, f"{rng.integers(90000, 99999)}", state_abbr, store_latitude, store_longitude,
+                           city, state, 0.0))
+            for _ in range(customers_per_store):
+                customers.append((f"C{len(customers):07d}", store_latitude + rng.normal(0, 0.05),
+                                  store_longitude + rng.normal(0, 0.05)))
+    products = []
+    for i, name in enumerate(PIZZAS):
+        for size, factor in SIZES.items():
+            category = 'Vegetarian' if name in ('Margherita', 'Veggie', 'Vegan') else 'Classic'
+            products.append((f"P{len(products):04d}", f"{name} Pizza", round((8 + i) * factor, 2), category, size,
+                             '', datetime.date(2018, 1, 1)))
+    return (pd.DataFrame(stores, columns=['storeid', 'zipcode', 'state_abbr', 'latitude', 'longitude', 'city',
+                                          'state', 'distance']),
+            pd.DataFrame(customers, columns=['customerid', 'latitude', 'longitude']),
+            pd.DataFrame(products, columns=['sku', 'name', 'price', 'category', 'size', 'ingredients', 'launch']))
+
+
+def generate_month(rng, month_start, count, first_id, stores, customers_per_store, products):
+    month_end = month_start + pd.offsets.MonthBegin(1)
+    days = (month_end - month_start).days
+    store_index = rng.integers(0, len(stores), count)
+    customer_index = store_index * customers_per_store + rng.integers(0, customers_per_store, count)
+    hours = rng.choice(24, count, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    orderdate = (month_start + pd.to_timedelta(rng.integers(0, days, count), unit='D')
+                 + pd.to_timedelta(hours, unit='h') + pd.to_timedelta(rng.integers(0, 3600, count), unit='s'))
+    nitems = rng.integers(1, 5, count)
+
+    order_ids = np.array([f"O{i:09d}" for i in range(first_id, first_id + count)], dtype=object)
+    item_order = np.repeat(np.arange(count), nitems)
+    item_product = rng.integers(0, len(products), len(item_order))
+    totals = np.bincount(item_order, weights=products['price'].to_numpy()[item_product], minlength=count)
+
+    orders = pd.DataFrame({
+        'orderid': order_ids,
+        'customerid': [f"C{i:07d}" for i in customer_index],
+        'storeid': stores['storeid'].to_numpy()[store_index],
+        'orderdate': orderdate,
+        'nitems': nitems,
+        'total': totals.round(2),
+    })
+    order_items = pd.DataFrame({'orderid': order_ids[item_order], 'sku': products['sku'].to_numpy()[item_product]})
+    return orders, order_items
+
+
+def insert_frame(cursor, df, table):
+    copy_frame(cursor, df, table, list(df.columns))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--orders', type=int, default=500_000)
+    parser.add_argument('--stores-per-city', type=int, default=5)
+    parser.add_argument('--customers-per-store', type=int, default=400)
+    parser.add_argument('--first-day', type=datetime.date.fromisoformat, default=datetime.date(2020, 1, 1))
+    parser.add_argument('--last-day', type=datetime.date.fromisoformat, default=datetime.date(2022, 12, 31))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    database = Database(dsn=args.dsn)
+    stores, customers, products = generate_dimensions(rng, args.stores_per_city, args.customers_per_store)
+    with database.cursor() as cursor:
+        cursor.execute(BASE_SCHEMA)
+        insert_frame(cursor, stores, 'stores')
+        insert_frame(cursor, customers, 'customers')
+        insert_frame(cursor, products, 'products')
+    apply_migrations(database)
+    with database.cursor() as cursor:
+        # Frontend.py (segments.py) liest die Positionen unter diesem Namen
+        cursor.execute("CREATE OR REPLACE VIEW orders_items AS SELECT orderid, sku FROM orderitems;")
+
+    months = pd.date_range(args.first_day, args.last_day, freq='MS')
+    per_month = args.orders // len(months)
+    for i, month_start in enumerate(months):
+        orders, order_items = generate_month(rng, month_start, per_month, i * per_month, stores,
+                                             args.customers_per_store, products)
+        load_orders(database, orders, order_items)
+
+    refresh_catchment(database)
+    build_or_update(database)
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Importzeit der Einstiegspunkte mit python -X importtime, verglichen mit einem Budget:
+#
+#   python benchmarks/import_time.py              # Bericht, Exit-Code 1 bei Überschreitung
+#   python benchmarks/import_time.py --top 30     # die 30 teuersten Module
+#   python benchmarks/import_time.py --update     # aktuelle Werte (+20% Reserve) als Budget speichern
+#
+# Jeder Einstiegspunkt wird in einem frischen Interpreter importiert. Module unter "forbidden" dürfen
+# beim Start gar nicht geladen werden (sie sind erst bei Bedarf zu importieren, siehe lazy_imports.py).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budget.json')
+HEADROOM = 1.2
+
+
+def measure(module):
+    # -X importtime schreibt pro Modul "import time: self [us] | cumulative | imported package" nach stderr
+    # Ohne Warmup-Threads, deren Importe im Hintergrund sonst mitgezählt würden
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            env=dict(os.environ, DASH_WARMUP='0'), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} fehlgeschlagen:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    total_ms = sum(self_us for self_us, _ in modules.values()) / 1000
+    return total_ms, modules
+
+
+def top_level(name):
+    return name.split('.')[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--update', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3, help='Bestwert aus n Läufen')
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, encoding='utf-8') as f:
+        budget = json.load(f)
+
+    failed = False
+    for module, limits in budget['entrypoints'].items():
+        runs = [measure(module) for _ in range(args.repeat)]
+        total_ms, modules = min(runs, key=lambda run: run[0])
+        loaded = {top_level(name) for name in modules}
+        forbidden = sorted(loaded & set(budget['forbidden']))
+
+        status = 'OK'
+        if total_ms > limits['total_ms'] or forbidden:
+            status = 'ÜBER BUDGET'
+            failed = True
+        print(f"{module}: {total_ms:.0f} ms (Budget {limits['total_ms']} ms), {len(modules)} Module - {status}")
+        if forbidden:
+            print(f"  beim Start geladen, obwohl verboten: {', '.join(forbidden)}")
+        by_package = {}
+        for name, (self_us, _) in modules.items():
+            by_package[top_level(name)] = by_package.get(top_level(name), 0) + self_us
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+        if args.update:
+            limits['total_ms'] = int(total_ms * HEADROOM)
+
+    if args.update:
+        with open(BUDGET_PATH, 'w', encoding='utf-8') as f:
+            json.dump(budget, f, indent=2)
+            f.write('\n')
+        print(f"Budget gespeichert: {BUDGET_PATH}")
+    elif failed:
+        sys.exit(1)
@@ -0,0 +1,224 @@
+import argparse
+import datetime
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+import requests
+
+# Lasttest: simulierte Analysten spielen typische Callback-Folgen als POST auf /_dash-update-component ab
+# und es werden Durchsatz, Latenz-Perzentile und Fehlerquote pro Callback gemessen.
+#
+#   python benchmarks/load_test.py --url http://localhost:8050 --app app --users 20 --duration 60
+#   python benchmarks/load_test.py --url http://localhost:8050 --app frontend --users 20
+#
+# Die Callbacks werden über /_dash-dependencies aufgelöst, die Anfragen haben damit dasselbe Format
+# wie die des Browsers. Clientseitige Callbacks (Drill-down, Städteauswahl über die Karte) erzeugen
+# keine Serveranfrage und fehlen deshalb.
+# Testdaten: python benchmarks/generate_data.py --dsn ...
+
+
+class DashClient:
+    def __init__(self, base_url, dependencies):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        # Jeder simulierte Nutzer ist ein eigener Tab (cancellation.TAB_STORE)
+        self.tab_id = uuid.uuid4().hex
+        self.callbacks = {}
+        for dependency in dependencies:
+            if dependency.get('clientside_function'):
+                continue
+            for output in self._outputs(dependency['output']):
+                self.callbacks[f"{output['id']}.{output['property']}"] = dependency
+
+    @staticmethod
+    def _outputs(output):
+        # "graph.figure" oder "..a.figure...b.figure.." bei mehreren Ausgaben
+        if output.startswith('..'):
+            parts = output[2:-2].split('...')
+        else:
+            parts = [output]
+        return [dict(zip(('id', 'property'), part.rsplit('.', 1))) for part in parts]
+
+    def triggered_by(self, input_key):
+        # Ausgabe des Callbacks mit diesem Input; bei allow_duplicate lautet sie z.B. "graph.figure@<hash>"
+        for output, dependency in self.callbacks.items():
+            if any(f"{item['id']}.{item['property']}" == input_key for item in dependency['inputs']):
+                return output
+        raise KeyError(input_key)
+
+    def call(self, output, values, changed):
+        # values: {"id.property": Wert} für Inputs und States, changed: auslösende "id.property"
+        dependency = self.callbacks[output]
+        outputs = self._outputs(dependency['output'])
+        values = dict(values, **{'query-tab.data': self.tab_id})
+        payload = {
+            'output': dependency['output'],
+            'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': [dict(item, value=values.get(f"{item['id']}.{item['property']}"))
+                       for item in dependency['inputs']],
+            'state': [dict(item, value=values.get(f"{item['id']}.{item['property']}"))
+                      for item in dependency.get('state', [])],
+            'changedPropIds': changed,
+        }
+        response = self.session.post(f"{self.base_url}/_dash-update-component", json=payload, timeout=120)
+        # 204: Callback hat PreventUpdate ausgelöst
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return response.json().get('response', {}) if response.status_code == 200 else {}
+
+
+def random_range(rng, first_day, last_day, min_days=7):
+    span = (last_day - first_day).days
+    start = first_day + datetime.timedelta(days=rng.randrange(max(span - min_days, 1)))
+    end = start + datetime.timedelta(days=rng.randrange(min_days, max(span - (start - first_day).days, min_days + 1)))
+    return start.isoformat(), min(end, last_day).isoformat()
+
+
+def with_exact(client, output, values, changed, preview_key):
+    # Wie im Browser: schreibt der Callback eine Vorschau, löst der Store den exakten Callback aus
+    response = yield output, values, changed
+    component, prop = preview_key.rsplit('.', 1)
+    preview = (response or {}).get(component, {}).get(prop)
+    if preview:
+        yield client.triggered_by(preview_key), dict(values, **{preview_key: preview}), [preview_key]
+    return response
+
+
+def stores_session(client, rng, args):
+    # Stores-Seite: Zeitraum laden, Städte wählen, Zeitraum ändern, Top-Pizzen umstellen
+    start, end = random_range(rng, args.first_day, args.last_day)
+    values = {'date-picker-range.start_date': start, 'date-picker-range.end_date': end,
+              'show-customer-toggle.value': ['show_customers'], 'top-pizza-metric.value': 'count',
+              'top-pizza-count.value': 3}
+    yield 'store-map.figure', values, ['date-picker-range.start_date']
+    sales = yield 'store-sales-data.data', values, ['date-picker-range.start_date']
+    cities = sorted(set((sales.get('store-sales-data', {}).get('data') or {}).get('store_cities', {}).values()))
+    if not cities:
+        return
+    values['city-dropdown.value'] = rng.sample(cities, min(len(cities), rng.randint(1, 3)))
+    yield 'store-info-boxes.children', values, ['city-dropdown.value']
+    yield 'catchment-distance-chart.figure', values, ['city-dropdown.value']
+    values['date-picker-range.start_date'], values['date-picker-range.end_date'] = random_range(
+        rng, args.first_day, args.last_day)
+    yield 'store-sales-data.data', values, ['date-picker-range.end_date']
+    yield 'store-info-boxes.children', values, ['date-picker-range.end_date']
+    values['top-pizza-metric.value'] = 'revenue'
+    yield 'store-info-boxes.children', values, ['top-pizza-metric.value']
+
+
+def pizza_session(client, rng, args):
+    # Pizza-Dashboard: Bestellungen pro Stunde für einen Zeitraum, dann Jahreswechsel auf der Karte
+    start, end = random_range(rng, args.first_day, args.last_day)
+    values = {'date-picker-range.start_date': start, 'date-picker-range.end_date': end,
+              'year-dropdown.value': rng.randint(args.first_day.year, args.last_day.year)}
+    yield from with_exact(client, 'order-time-graph.figure', values, ['date-picker-range.start_date'],
+                          'order-time-preview.data')
+    yield 'choropleth-map.figure', values, ['year-dropdown.value']
+    values['year-dropdown.value'] = rng.randint(args.first_day.year, args.last_day.year)
+    yield 'choropleth-map.figure', values, ['year-dropdown.value']
+
+
+def frontend_session(client, rng, args):
+    # Frontend.py: Umsatz laden (Stores, Zeitraum, Granularität), dann Cluster und Jahre wechseln
+    start, end = random_range(rng, args.first_day, args.last_day)
+    stores = rng.sample(args.stores, min(len(args.stores), rng.randint(1, 5))) if args.stores else None
+    values = {'store-dropdown.value': stores, 'load-data-btn.n_clicks': 1,
+              'date-picker-range.start_date': start, 'date-picker-range.end_date': end,
+              'granularity-radio.value': rng.choice(['month', 'week', 'day']),
+              'cluster-dropdown.value': 'all', 'date-slider.value': [args.first_day.year, args.last_day.year]}
+    yield from with_exact(client, 'graph.figure', values, ['load-data-btn.n_clicks'], 'sales-preview.data')
+    values['granularity-radio.value'] = 'month'
+    yield from with_exact(client, 'graph.figure', values, ['granularity-radio.value'], 'sales-preview.data')
+    values['cluster-dropdown.value'] = rng.choice([0, 1, 2, 'all'])
+    yield 'cluster-graph.figure', values, ['cluster-dropdown.value']
+    year = rng.randint(args.first_day.year, args.last_day.year)
+    values['date-slider.value'] = [year, year]
+    yield 'cluster-graph.figure', values, ['date-slider.value']
+
+
+SESSIONS = {
+    'app': [stores_session, pizza_session],
+    'frontend': [frontend_session],
+}
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, name, latency, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies[name].append(latency)
+            else:
+                self.errors[name] += 1
+
+    def report(self, duration):
+        names = sorted(set(self.latencies) | set(self.errors))
+        print(f"{'Callback':<34} {'Anfragen':>8} {'req/s':>7} {'Fehler':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        total = 0
+        for name in names:
+            latencies = np.array(self.latencies[name]) * 1000
+            requests_count = len(latencies) + self.errors[name]
+            total += requests_count
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+            print(f"{name:<34} {requests_count:>8} {requests_count / duration:>7.1f} "
+                  f"{self.errors[name] / requests_count:>7.1%} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f}")
+        print(f"Gesamt: {total} Anfragen in {duration:.0f}s, {total / duration:.1f} req/s")
+
+
+def simulated_user(base_url, dependencies, args, results, stop_at, seed):
+    rng = random.Random(seed)
+    client = DashClient(base_url, dependencies)
+    while time.monotonic() < stop_at:
+        session = rng.choice(SESSIONS[args.app])(client, rng, args)
+        response = None
+        try:
+            while time.monotonic() < stop_at:
+                output, values, changed = session.send(response)
+                started = time.monotonic()
+                try:
+                    response = client.call(output, values, changed)
+                    results.add(output, time.monotonic() - started)
+                except Exception as e:
+                    response = {}
+                    results.add(output, time.monotonic() - started, error=e)
+                # Denkpause zwischen zwei Interaktionen
+                time.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+        except StopIteration:
+            pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8050')
+    parser.add_argument('--app', choices=sorted(SESSIONS), default='app')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--duration', type=int, default=60, help='Sekunden')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='Sekunden bis alle Nutzer aktiv sind')
+    parser.add_argument('--think', type=float, default=1.0, help='mittlere Denkpause in Sekunden')
+    parser.add_argument('--first-day', type=datetime.date.fromisoformat, default=datetime.date(2020, 1, 1))
+    parser.add_argument('--last-day', type=datetime.date.fromisoformat, default=datetime.date(2022, 12, 31))
+    parser.add_argument('--stores', nargs='*', default=[], help='Store IDs für Frontend.py')
+    args = parser.parse_args()
+
+    dependencies = requests.get(f"{args.url.rstrip('/')}/_dash-dependencies", timeout=30).json()
+    results = Results()
+    started = time.monotonic()
+    stop_at = started + args.ramp_up + args.duration
+    threads = []
+    for i in range(args.users):
+        thread = threading.Thread(target=simulated_user, args=(args.url, dependencies, args, results, stop_at, i),
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(args.ramp_up / max(args.users, 1))
+    for thread in threads:
+        thread.join()
+    results.report(time.monotonic() - started)
@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dash
+
+from db import Database
+
+# Die Seitenmodule registrieren sich beim Import, dafür braucht es eine App
+dash.Dash(__name__, use_pages=True)
+import stores  # noqa: E402
+
+# Führt die SQL-Abfragen der Dashboards gegen eine echte Datenbank aus und vergleicht sie mit einer
+# einfachen Referenzrechnung. Die Getter fangen Fehler ab und liefern leere Frames, ein SQL-Fehler
+# fällt im Dashboard also nur als "No data available." auf:
+#
+#   python benchmarks/generate_data.py --dsn "dbname=pizzeria_load user=postgres" --orders 200000
+#   python benchmarks/query_check.py --dsn "dbname=pizzeria_load user=postgres"
+#
+# Exit-Code 1, sobald eine Prüfung fehlschlägt.
+
+REFERENCE_PIZZAS = """
+                   SELECT o.storeid, p.name, COUNT(oi.orderid), SUM(p.price)
+                   FROM orders o
+                   JOIN orderitems oi ON o.orderid = oi.orderid AND oi.orderdate = o.orderdate
+                   JOIN products p ON oi.sku = p.sku
+                   WHERE o.storeid IN %s
+                   AND o.orderdate >= %s::date AND o.orderdate < %s::date + 1
+                   GROUP BY o.storeid, p.name;
+                   """
+
+
+def check_top_pizzas(cursor, store_ids, start_date, end_date, n=3):
+    cursor.execute(REFERENCE_PIZZAS, (store_ids, start_date, end_date))
+    reference = cursor.fetchall()
+    failures = []
+    for metric, position in (('count', 2), ('revenue', 3)):
+        cursor.execute(stores.top_pizzas_query(metric), (store_ids, start_date, end_date, n))
+        ranked = [(store_id, name) for store_id, name, _, _ in cursor.fetchall()]
+        expected = []
+        for store_id in sorted({row[0] for row in reference}):
+            rows = sorted((row for row in reference if row[0] == store_id), key=lambda row: (-row[position], row[1]))
+            expected += [(store_id, row[1]) for row in rows[:n]]
+        if not ranked:
+            failures.append(f"top_pizzas({metric}): keine Zeilen")
+        elif ranked != expected:
+            failures.append(f"top_pizzas({metric}): Reihenfolge weicht ab, z.B. {ranked[:3]} statt {expected[:3]}")
+    return failures
+
+
+def check_partition_pruning(cursor, store_ids, start_date, end_date):
+    # orderitems ist nach orderdate partitioniert: ohne oi.orderdate = o.orderdate im Join liest der Plan
+    # alle Monate statt nur die des Zeitraums
+    cursor.execute("SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'orderitems'::regclass;")
+    partitions = cursor.fetchone()[0]
+    cursor.execute("EXPLAIN " + stores.top_pizzas_query('count'), (store_ids, start_date, end_date, 3))
+    plan = '\n'.join(row[0] for row in cursor.fetchall())
+    scanned = len({word for word in plan.split() if word.startswith('orderitems_y')})
+    if partitions > 1 and scanned >= partitions:
+        return [f"top_pizzas: alle {partitions} orderitems-Partitionen im Plan, keine Partition Pruning"]
+    return []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--start', default='2022-01-01')
+    parser.add_argument('--end', default='2022-12-31')
+    parser.add_argument('--stores', type=int, default=5, help='Anzahl Stores in den Abfragen')
+    args = parser.parse_args()
+
+    database = Database(dsn=args.dsn)
+    with database.cursor() as cursor:
+        cursor.execute("SELECT storeid FROM stores ORDER BY storeid LIMIT %s;", (args.stores,))
+        store_ids = tuple(row[0] for row in cursor.fetchall())
+        if not store_ids:
+            sys.exit("Keine Stores in der Datenbank, zuerst benchmarks/generate_data.py ausführen")
+        failures = check_top_pizzas(cursor, store_ids, args.start, args.end)
+        failures += check_partition_pruning(cursor, store_ids, args.start, args.end)
+
+    for failure in failures:
+        print(f"FEHLER {failure}")
+    print(f"{len(failures)} Fehler")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,67 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from aggregations import hourly_order_counts
+
+# Vergleicht den Speicher-Peak von fetchall()+DataFrame mit der blockweisen Aggregation.
+# Ohne --dsn werden synthetische Bestellungen erzeugt, mit --dsn wird die Datenbank gelesen.
+
+
+def synthetic_chunks(rows, chunk_size):
+    start = datetime.datetime(2020, 1, 1)
+    for offset in range(0, rows, chunk_size):
+        yield [(f"order-{i}", start + datetime.timedelta(minutes=random.randrange(1_500_000)))
+               for i in range(offset, min(offset + chunk_size, rows))]
+
+
+def database_chunks(dsn, chunk_size):
+    from db import Database
+
+    # Gleiche Abfrage wie pizzaDashboard.ORDERS_QUERY, ohne die Seite zu importieren
+    database = Database(dsn=dsn)
+    return database.stream('SELECT "orderid", "orderdate"::timestamp - INTERVAL \'9 hours\' FROM orders',
+                           chunk_size=chunk_size)
+
+
+def materialized(chunks):
+    rows = [row for chunk in chunks for row in chunk]
+    df = pd.DataFrame(rows, columns=["orderid", "orderdate"])
+    df["orderdate"] = pd.to_datetime(df["orderdate"], errors='coerce')
+    return df.groupby(df['orderdate'].dt.hour).size().reset_index(name='count')
+
+
+def measure(label, func, chunks):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func(chunks)
+    duration = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} peak {peak / 1024 / 1024:8.1f} MB   {duration:6.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=10_000)
+    parser.add_argument('--dsn', help='z.B. "host=localhost dbname=pizzeria user=postgres password=..."')
+    args = parser.parse_args()
+
+    def chunks():
+        if args.dsn:
+            return database_chunks(args.dsn, args.chunk_size)
+        return synthetic_chunks(args.rows, args.chunk_size)
+
+    source = 'Datenbank' if args.dsn else f'{args.rows} synthetische Zeilen'
+    print(f"{source}, Blockgröße {args.chunk_size}")
+    measure('fetchall', materialized, chunks())
+    measure('streaming', hourly_order_counts, chunks())
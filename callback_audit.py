@@ -0,0 +1,74 @@
+import dis
+import importlib
+import inspect
+import sys
+
+import pandas as pd
+
+# Properties that only change the layout, never the data shown
+LAYOUT_PROPS = {'is_open', 'style', 'className', 'hidden', 'disabled', 'active', 'n_clicks'}
+# Global names that indicate a callback reads from the database or the loaded data
+DATA_NAMES = {'engine', 'connection', 'cursor', 'db', 'warmup', 'pd', 'px', 'go'}
+DATA_PREFIXES = ('load_', 'get_', 'fetch_', 'build_', 'read_')
+DATA_SUFFIXES = ('_cache',)
+
+
+def _referenced_globals(func):
+    names = set()
+    codes = [func.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(ins.argval for ins in dis.get_instructions(code) if ins.opname in ('LOAD_GLOBAL', 'LOAD_NAME'))
+        codes.extend(const for const in code.co_consts if hasattr(const, 'co_code'))
+    return names
+
+
+def _touches_data(func):
+    # Through every decorator layer (e.g. @cancellable over a profiling wrapper) to the callback itself
+    func = inspect.unwrap(func)
+    for name in _referenced_globals(func):
+        if name in DATA_NAMES or name.startswith(DATA_PREFIXES) or name.endswith(DATA_SUFFIXES):
+            return True
+        if isinstance(func.__globals__.get(name), (pd.DataFrame, pd.Series)):
+            return True
+    return False
+
+
+def _outputs(key):
+    # "a.b" or "..a.b...c.d.." for multi-output callbacks
+    return [part for part in key.strip('.').split('...') if part]
+
+
+def _callback_map(app):
+    from dash._callback import GLOBAL_CALLBACK_MAP
+
+    callback_map = dict(GLOBAL_CALLBACK_MAP)
+    callback_map.update(app.callback_map)
+    return callback_map
+
+
+def find_layout_only_callbacks(app):
+    # Server callbacks that only change layout properties or never read data belong on the client
+    findings = []
+    for key, entry in _callback_map(app).items():
+        func = entry.get('callback')
+        if func is None:
+            # Clientside callbacks have no server function and already run in the browser
+            continue
+        outputs = _outputs(key)
+        layout_only = all(output.rsplit('.', 1)[-1] in LAYOUT_PROPS for output in outputs)
+        if layout_only or not _touches_data(func):
+            name = getattr(inspect.unwrap(func), '__name__', '?')
+            findings.append((name, outputs))
+    return findings
+
+
+if __name__ == '__main__':
+    module = importlib.import_module(sys.argv[1] if len(sys.argv) > 1 else 'Frontend')
+    findings = find_layout_only_callbacks(module.app)
+    for name, outputs in findings:
+        print(f"{name}: {', '.join(outputs)}")
+    if findings:
+        print(f"{len(findings)} server callback(s) do not touch data and should run clientside")
+        sys.exit(1)
+    print("All server callbacks are data-bound")
@@ -0,0 +1,141 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import has_request_context
+
+# Abbruch überholter Abfragen: jeder Aufruf eines mit @cancellable markierten Callbacks bekommt einen
+# Scope (Tab, Callback). Startet derselbe Tab den Callback erneut (z.B. beim Ziehen im Datumsbereich
+# oder beim Bearbeiten der Städteauswahl), werden die noch laufenden Abfragen des älteren Aufrufs
+# abgebrochen und der ältere Aufruf liefert kein Ergebnis mehr. Der Tab wird über eine ID im Layout
+# erkannt, nicht über ein Cookie: mehrere Tabs desselben Browsers stören sich nicht.
+# Die Abfragen tragen application_name = "dash:<Tab>:<Callback>" (sichtbar in pg_stat_activity)
+# und ein statement_timeout pro Request. Im selben Prozess bricht connection.cancel() sofort ab; lief
+# der ältere Aufruf in einem anderen gunicorn-Worker, bricht die erste Abfrage des neuen Aufrufs ihn
+# per pg_cancel_backend() ab (gleicher application_name, früher gestartete Transaktion, siehe
+# db._tag_transaction). Es gibt kein Debounce: ein sleep() vor der ersten Abfrage würde einen
+# Worker-Thread blockieren, überholte Aufrufe werden stattdessen abgebrochen.
+
+QUERY_TIMEOUT_MS = int(os.environ.get('QUERY_TIMEOUT_MS', 30000))
+# dcc.Store mit der Tab-ID; @cancellable-Callbacks bekommen sie als letzten State
+TAB_STORE = 'query-tab'
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    # statement_timeout erreicht: kein Ergebnis, das zwischengespeichert werden darf
+    pass
+
+
+class QueryScope:
+    def __init__(self, tab, name):
+        self.tab = tab
+        self.name = name
+        self.superseded = False
+        # Beginn des Aufrufs (Unix-Zeit); ältere Transaktionen mit demselben application_name sind überholt
+        self.started = time.time()
+        self._remote_cancel_pending = True
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    @property
+    def application_name(self):
+        # application_name ist auf 63 Zeichen begrenzt
+        return f"dash:{self.tab[:12]}:{self.name}"[:63]
+
+    def check(self):
+        if self.superseded:
+            raise QueryCancelled(f"{self.name} wurde von einem neueren Aufruf abgelöst")
+
+    @contextmanager
+    def attach(self, connection):
+        # Während der Abfragen ist die Verbindung abbrechbar; vor der Rückgabe an den Pool wird sie
+        # wieder abgemeldet, damit ein später Abbruch nie die Abfrage eines anderen Requests trifft
+        with self._lock:
+            self.check()
+            self._connections.add(connection)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._connections.discard(connection)
+
+    def claim_remote_cancel(self):
+        # Nur die erste Verbindung des Aufrufs bricht ältere Aufrufe in anderen Prozessen ab
+        with self._lock:
+            pending = self._remote_cancel_pending
+            self._remote_cancel_pending = False
+            return pending
+
+    def cancel(self):
+        with self._lock:
+            self.superseded = True
+            for connection in self._connections:
+                try:
+                    connection.cancel()
+                except Exception as e:
+                    print(f"Fehler beim Abbrechen der Abfrage von {self.name}: {e}")
+
+
+_current = contextvars.ContextVar('query_scope', default=None)
+_active = {}
+_lock = threading.Lock()
+
+
+def current():
+    return _current.get()
+
+
+def tab_store():
+    # In jedes Seitenlayout, das @cancellable-Callbacks hat; jeder Seitenaufruf bekommt eine neue ID
+    from dash import dcc
+    return dcc.Store(id=TAB_STORE, data=uuid.uuid4().hex)
+
+
+@contextmanager
+def scope(name, tab):
+    if not has_request_context() or not tab:
+        yield None
+        return
+    key = (str(tab), name)
+    new_scope = QueryScope(*key)
+    with _lock:
+        previous = _active.get(key)
+        _active[key] = new_scope
+    if previous is not None:
+        previous.cancel()
+    token = _current.set(new_scope)
+    try:
+        yield new_scope
+    finally:
+        _current.reset(token)
+        with _lock:
+            if _active.get(key) is new_scope:
+                del _active[key]
+
+
+def cancellable(func):
+    # Unter @callback setzen, mit State(TAB_STORE, 'data') als letztem Argument; der Wrapper nimmt es
+    # heraus. Abgelöste Aufrufe enden mit PreventUpdate (der Browser verwirft sie ohnehin)
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        *args, tab = args
+        with scope(func.__name__, tab) as query_scope:
+            if query_scope is None:
+                return func(*args, **kwargs)
+            try:
+                query_scope.check()
+                result = func(*args, **kwargs)
+                query_scope.check()
+            except QueryCancelled:
+                from dash.exceptions import PreventUpdate
+                raise PreventUpdate
+            return result
+    return wrapper
@@ -0,0 +1,101 @@
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+# Einzugsgebiete: jeder Kunde wird seinem nächsten und zweitnächsten Store zugeordnet.
+# Ein BallTree mit Haversine-Metrik über die wenigen Stores beantwortet die Abfrage für alle Kunden
+# in einem Aufruf, statt Kunde × Store geodesic-Schleifen zu rechnen.
+
+EARTH_RADIUS_MILES = 3958.8
+
+CATCHMENT_COLUMNS = ['customerid', 'nearest_storeid', 'nearest_miles', 'second_storeid', 'second_miles']
+
+# Verteilung der Entfernungen zum nächsten Store in DISTANCE_BUCKET_MILES breiten Klassen
+DISTANCE_BUCKET_MILES = 2
+DISTANCE_BUCKETS = 10
+
+CATCHMENT_SUMMARY_QUERY = """
+                          SELECT nearest_storeid, COUNT(*) as customers,
+                                 percentile_cont(0.5) WITHIN GROUP (ORDER BY nearest_miles) as median_miles,
+                                 percentile_cont(0.5) WITHIN GROUP (ORDER BY second_miles - nearest_miles)
+                                     as median_competitor_gap
+                          FROM customer_catchment
+                          GROUP BY nearest_storeid;
+                          """
+
+DISTANCE_DISTRIBUTION_QUERY = """
+                              SELECT nearest_storeid,
+                                     LEAST(FLOOR(nearest_miles / %(width)s), %(buckets)s)::int as bucket,
+                                     COUNT(*) as customers
+                              FROM customer_catchment
+                              WHERE nearest_storeid IN %(store_ids)s
+                              GROUP BY nearest_storeid, bucket
+                              ORDER BY nearest_storeid, bucket;
+                              """
+
+
+def assign_nearest_stores(stores, customers):
+    # stores: storeid, latitude, longitude; customers: customerid, latitude, longitude
+    from sklearn.neighbors import BallTree
+
+    stores = stores.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+    customers = customers.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+    if stores.empty or customers.empty:
+        return pd.DataFrame(columns=CATCHMENT_COLUMNS)
+
+    tree = BallTree(np.radians(stores[['latitude', 'longitude']].to_numpy(dtype=float)), metric='haversine')
+    k = min(2, len(stores))
+    distances, indices = tree.query(np.radians(customers[['latitude', 'longitude']].to_numpy(dtype=float)), k=k)
+    distances *= EARTH_RADIUS_MILES
+
+    store_ids = stores['storeid'].to_numpy()
+    result = pd.DataFrame({
+        'customerid': customers['customerid'],
+        'nearest_storeid': store_ids[indices[:, 0]],
+        'nearest_miles': distances[:, 0],
+    })
+    if k > 1:
+        result['second_storeid'] = store_ids[indices[:, 1]]
+        result['second_miles'] = distances[:, 1]
+    else:
+        result['second_storeid'] = None
+        result['second_miles'] = np.nan
+    return result
+
+
+def refresh_catchment(db):
+    started = time.perf_counter()
+    stores = db.fetch_frame("SELECT storeid, latitude, longitude FROM stores")
+    customers = db.fetch_frame("SELECT customerid, latitude, longitude FROM customers")
+    catchment = assign_nearest_stores(stores, customers)
+
+    # Vollständig ersetzen; TRUNCATE und COPY in einer Transaktion, Leser sehen den alten Stand bis zum Commit
+    buffer = io.StringIO()
+    catchment[CATCHMENT_COLUMNS].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with db.cursor() as cursor:
+        cursor.execute("TRUNCATE customer_catchment;")
+        cursor.copy_expert(f"COPY customer_catchment ({', '.join(CATCHMENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                           buffer)
+        cursor.execute("ANALYZE customer_catchment;")
+    print(f"Einzugsgebiete für {len(catchment)} Kunden und {len(stores)} Stores in "
+          f"{time.perf_counter() - started:.1f}s berechnet")
+    return len(catchment)
+
+
+def get_catchment_summary(cursor):
+    cursor.execute(CATCHMENT_SUMMARY_QUERY)
+    return pd.DataFrame(cursor.fetchall(),
+                        columns=["Store ID", "Catchment Customers", "Median Miles", "Median Competitor Gap"])
+
+
+def get_distance_distribution(cursor, store_ids):
+    cursor.execute(DISTANCE_DISTRIBUTION_QUERY,
+                   {'width': DISTANCE_BUCKET_MILES, 'buckets': DISTANCE_BUCKETS, 'store_ids': tuple(store_ids)})
+    df = pd.DataFrame(cursor.fetchall(), columns=["Store ID", "Bucket", "Customers"])
+    df['Distance'] = [f"{bucket * DISTANCE_BUCKET_MILES}+ mi" if bucket >= DISTANCE_BUCKETS else
+                      f"{bucket * DISTANCE_BUCKET_MILES}-{(bucket + 1) * DISTANCE_BUCKET_MILES} mi"
+                      for bucket in df['Bucket']]
+    return df
@@ -0,0 +1,268 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+from lazy_imports import lazy_import
+
+sparse = lazy_import('scipy.sparse')
+
+# Aufbau des Schnappschusses; andere Formate werden neu aufgebaut
+SNAPSHOT_FORMAT = 2
+
+# Vorberechneter SKU×SKU-Index "wird zusammen gekauft mit": Eintrag (i, j) zählt die Bestellungen,
+# die beide Produkte enthalten, die Diagonale die Bestellungen mit dem Produkt überhaupt.
+# Aufgebaut in einem Streaming-Durchlauf über orderitems und danach nur noch um neue Bestellungen ergänzt,
+# zur Laufzeit gibt es keine paarweisen Joins in SQL. Ergänzt wird ausschließlich von ingest.py: der Loader
+# übergibt die gerade geladenen Bestellungen (auch nachgeladene mit älterem Zeitstempel) und speichert einen
+# neuen Schnappschuss, die Dash-Worker laden nur diesen Schnappschuss neu. Als Wasserstand pro Monat dient die
+# Anzahl enthaltener Bestellungen; weicht sie von der Datenbank ab (Bestellungen an ingest.py vorbei
+# geladen), werden neue Monate nachgelesen, bei geänderten Monaten wird der Index neu aufgebaut.
+
+COPURCHASE_PATH = os.environ.get('COPURCHASE_PATH',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copurchase.pkl'))
+
+# Sortiert nach orderid, damit die Positionen einer Bestellung zusammenhängend ankommen
+BASKETS_QUERY = """
+                SELECT oi.orderid, o.storeid, oi.sku, o.orderdate
+                FROM orderitems oi
+                JOIN orders o ON o.orderid = oi.orderid AND o.orderdate = oi.orderdate
+                {where}
+                ORDER BY oi.orderid;
+                """
+
+# Nur Bestellungen mit Positionen, wie im Index
+MONTH_COUNTS_QUERY = """
+                     SELECT date_trunc('month', o.orderdate) as month, COUNT(*)
+                     FROM orders o
+                     WHERE EXISTS (SELECT 1 FROM orderitems oi
+                                   WHERE oi.orderid = o.orderid AND oi.orderdate = o.orderdate)
+                     GROUP BY month;
+                     """
+
+
+def _pad(matrix, size):
+    # Neue Produkte: Matrix mit leeren Zeilen/Spalten auf die aktuelle Anzahl SKUs erweitern
+    if matrix.shape[0] == size:
+        return matrix
+    matrix = matrix.tocoo()
+    return sparse.csr_matrix((matrix.data, (matrix.row, matrix.col)), shape=(size, size))
+
+
+class CoPurchaseIndex:
+    def __init__(self):
+        self.skus = []
+        self.sku_index = {}
+        self.total = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.by_store = {}
+        self.order_counts = {}
+        self.orders = 0
+        self.watermark = None
+        # Wasserstand: enthaltene Bestellungen pro Monat
+        self.month_counts = {}
+        # Änderungszeit des geladenen Schnappschusses (siehe snapshot_version)
+        self.version = None
+        self._lock = threading.Lock()
+        # Ein update() zur Zeit, sonst lesen zwei Läufe denselben Monat und zählen doppelt
+        self._update_lock = threading.Lock()
+
+    def _sku_codes(self, skus):
+        for sku in pd.unique(skus):
+            if sku not in self.sku_index:
+                self.sku_index[sku] = len(self.skus)
+                self.skus.append(sku)
+        return np.fromiter((self.sku_index[sku] for sku in skus), dtype=np.int64, count=len(skus))
+
+    def add_baskets(self, baskets):
+        # baskets: DataFrame mit orderid, storeid, sku, orderdate; jede Bestellung vollständig und nur
+        # einmal enthalten (der Index prüft das nicht)
+        if baskets.empty:
+            return 0
+        order_codes, order_ids = pd.factorize(baskets['orderid'])
+        sku_codes = self._sku_codes(baskets['sku'].to_numpy())
+        size = len(self.skus)
+
+        # Bestellung×SKU-Inzidenzmatrix; mehrfach bestellte Pizzen zählen pro Bestellung einmal
+        incidence = sparse.csr_matrix((np.ones(len(order_codes), dtype=np.int64), (order_codes, sku_codes)),
+                                      shape=(len(order_ids), size))
+        incidence.data[:] = 1
+        order_stores = baskets.groupby(order_codes)['storeid'].first()
+        order_months = pd.to_datetime(baskets.groupby(order_codes)['orderdate'].first()).dt.to_period('M')
+        month_updates = order_months.value_counts()
+
+        total = (incidence.T @ incidence).tocsr()
+        store_updates = {}
+        for store_id, rows in order_stores.groupby(order_stores).groups.items():
+            store_incidence = incidence[rows.to_numpy()]
+            store_updates[store_id] = ((store_incidence.T @ store_incidence).tocsr(), len(rows))
+
+        # Neue Matrizen vollständig aufbauen und erst dann austauschen, Leser sehen nie einen Zwischenstand
+        with self._lock:
+            self.total = _pad(self.total, size) + total
+            by_store = dict(self.by_store)
+            order_counts = dict(self.order_counts)
+            for store_id, (matrix, count) in store_updates.items():
+                previous = by_store.get(store_id)
+                by_store[store_id] = matrix if previous is None else _pad(previous, size) + matrix
+                order_counts[store_id] = order_counts.get(store_id, 0) + count
+            self.by_store = by_store
+            self.order_counts = order_counts
+            self.orders += len(order_ids)
+            month_counts = dict(self.month_counts)
+            for month, count in month_updates.items():
+                month = month.to_timestamp()
+                month_counts[month] = month_counts.get(month, 0) + int(count)
+            self.month_counts = month_counts
+            latest = pd.Timestamp(baskets['orderdate'].max())
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+        return len(order_ids)
+
+    def add_chunks(self, chunks):
+        # chunks: Zeilenblöcke aus Database.stream; die letzte Bestellung eines Blocks kann im nächsten
+        # weitergehen und wird deshalb zurückgehalten
+        added = 0
+        pending = None
+        for rows in chunks:
+            frame = pd.DataFrame(rows, columns=['orderid', 'storeid', 'sku', 'orderdate'])
+            if pending is not None:
+                frame = pd.concat([pending, frame], ignore_index=True)
+            last_order = frame['orderid'].iat[-1]
+            complete = frame['orderid'] != last_order
+            pending = frame[~complete]
+            added += self.add_baskets(frame[complete])
+        if pending is not None:
+            added += self.add_baskets(pending)
+        return added
+
+    def add_loaded(self, orders, order_items):
+        # Von ingest.py nach dem Commit mit den gerade geladenen Bestellungen aufgerufen, ohne sie erneut zu lesen
+        orders = orders.rename(columns=str.lower)
+        order_items = order_items.rename(columns=str.lower)
+        baskets = order_items[['orderid', 'sku']].merge(orders[['orderid', 'storeid', 'orderdate']], on='orderid')
+        baskets['orderdate'] = pd.to_datetime(baskets['orderdate'])
+        with self._update_lock:
+            return self.add_baskets(baskets.sort_values('orderid', kind='stable'))
+
+    def update(self, db):
+        # Wasserstände mit der Datenbank abgleichen; nur für ingest.py, nicht für Callbacks
+        with self._update_lock:
+            return self._update(db)
+
+    def _update(self, db):
+        with db.cursor() as cursor:
+            cursor.execute(MONTH_COUNTS_QUERY)
+            month_counts = {pd.Timestamp(month): count for month, count in cursor.fetchall()}
+        changed = [month for month, count in month_counts.items()
+                   if self.month_counts.get(month, 0) not in (0, count)]
+        if not self.month_counts or changed or set(self.month_counts) - set(month_counts):
+            # Ohne Bestell-IDs lässt sich ein teilweise enthaltener Monat nicht ergänzen: neu aufbauen
+            if self.month_counts:
+                print(f"Co-Purchase-Index weicht in {len(changed)} Monat(en) ab, wird neu aufgebaut")
+            self._clear()
+            return self.add_chunks(db.stream(BASKETS_QUERY.format(where=''), None))
+
+        added = 0
+        sql_query = BASKETS_QUERY.format(where='WHERE oi.orderdate >= %(start)s AND oi.orderdate < %(end)s '
+                                               'AND o.orderdate >= %(start)s AND o.orderdate < %(end)s')
+        for month in sorted(month_counts):
+            if month in self.month_counts:
+                continue
+            # Monat fehlt ganz im Index: vollständig nachlesen, es kann nichts doppelt zählen
+            params = {'start': month.to_pydatetime(), 'end': (month + pd.offsets.MonthBegin()).to_pydatetime()}
+            added += self.add_chunks(db.stream(sql_query, params))
+        return added
+
+    def _clear(self):
+        with self._lock:
+            self.skus = []
+            self.sku_index = {}
+            self.total = sparse.csr_matrix((0, 0), dtype=np.int64)
+            self.by_store = {}
+            self.order_counts = {}
+            self.orders = 0
+            self.watermark = None
+            self.month_counts = {}
+
+    def top_k(self, sku, k=5, store_id=None):
+        columns = ['sku', 'orders', 'confidence', 'lift']
+        if store_id is None:
+            matrix, orders = self.total, self.orders
+        else:
+            matrix, orders = self.by_store.get(store_id), self.order_counts.get(store_id, 0)
+        i = self.sku_index.get(sku)
+        if matrix is None or i is None or i >= matrix.shape[0] or not orders:
+            return pd.DataFrame(columns=columns)
+
+        row = matrix.getrow(i)
+        mask = row.indices != i
+        partners, counts = row.indices[mask], row.data[mask]
+        baskets = matrix[i, i]
+        if not baskets or not len(counts):
+            return pd.DataFrame(columns=columns)
+
+        # argpartition statt vollständiger Sortierung, nur die k besten werden sortiert
+        k = min(k, len(counts))
+        top = np.argpartition(-counts, k - 1)[:k]
+        top = top[np.argsort(-counts[top], kind='stable')]
+        diagonal = matrix.diagonal()
+        confidence = counts[top] / baskets
+        lift = confidence / (diagonal[partners[top]] / orders)
+        return pd.DataFrame({'sku': [self.skus[j] for j in partners[top]], 'orders': counts[top],
+                             'confidence': confidence, 'lift': lift}, columns=columns)
+
+    def save(self, path=COPURCHASE_PATH):
+        # Schnappschuss, damit neue Prozesse nicht alle Bestellungen erneut lesen müssen
+        with self._lock:
+            state = {'skus': self.skus, 'total': self.total, 'by_store': self.by_store,
+                     'order_counts': self.order_counts, 'orders': self.orders, 'watermark': self.watermark,
+                     'month_counts': self.month_counts, 'format': SNAPSHOT_FORMAT}
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=COPURCHASE_PATH):
+        index = cls()
+        version = snapshot_version(path)
+        if version is None:
+            return index
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('format') != SNAPSHOT_FORMAT:
+            # Älterer Schnappschuss ohne Wasserstände: ohne sie lässt sich nicht ergänzen, neu aufbauen
+            return index
+        index.skus = state['skus']
+        index.sku_index = {sku: i for i, sku in enumerate(index.skus)}
+        index.total = state['total']
+        index.by_store = state['by_store']
+        index.order_counts = state['order_counts']
+        index.orders = state['orders']
+        index.watermark = state['watermark']
+        index.month_counts = state['month_counts']
+        index.version = version
+        return index
+
+
+def snapshot_version(path=COPURCHASE_PATH):
+    # Änderungszeit des Schnappschusses; save() ersetzt die Datei atomar, eine neue Zeit heißt neuer Index
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def build_or_update(db, orders=None, order_items=None, path=COPURCHASE_PATH):
+    # Vorhandenen Schnappschuss laden, die gerade geladenen Bestellungen ergänzen, mit der Datenbank
+    # abgleichen und wieder speichern
+    index = CoPurchaseIndex.load(path)
+    added = 0
+    if orders is not None and index.month_counts:
+        added += index.add_loaded(orders, order_items)
+    added += index.update(db)
+    index.save(path)
+    print(f"Co-Purchase-Index: {added} neue Bestellungen, {index.orders} insgesamt, {len(index.skus)} Produkte")
+    return index
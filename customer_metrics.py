@@ -0,0 +1,73 @@
+import pandas as pd
+
+# Inkrementelle Pflege von customer_metrics (migrations/002_customer_metrics.sql): es werden nur die
+# gerade geladenen Bestellungen aggregiert und zu den bestehenden Werten addiert.
+# Alle Anweisungen laufen im Cursor des Loaders, also in derselben Transaktion wie das Einfügen.
+
+NEW_ORDERS = """
+             SELECT orderid, customerid, storeid, orderdate, total
+             FROM orders
+             WHERE orderid = ANY(%(orderids)s)
+             AND orderdate BETWEEN %(start)s AND %(end)s
+             """
+
+UPSERT_STORE_ORDERS = f"""
+                      INSERT INTO customer_store_orders AS c (customerid, storeid, orders)
+                      SELECT customerid, storeid, COUNT(*)
+                      FROM ({NEW_ORDERS}) o
+                      WHERE customerid IS NOT NULL AND storeid IS NOT NULL
+                      GROUP BY customerid, storeid
+                      ON CONFLICT (customerid, storeid) DO UPDATE SET orders = c.orders + EXCLUDED.orders;
+                      """
+
+UPSERT_CATEGORY_ITEMS = f"""
+                        INSERT INTO customer_category_items AS c (customerid, category, items)
+                        SELECT o.customerid, p.category, COUNT(*)
+                        FROM ({NEW_ORDERS}) o
+                        JOIN orderitems oi ON oi.orderid = o.orderid AND oi.orderdate = o.orderdate
+                        JOIN products p ON p.sku = oi.sku
+                        WHERE o.customerid IS NOT NULL AND p.category IS NOT NULL
+                        GROUP BY o.customerid, p.category
+                        ON CONFLICT (customerid, category) DO UPDATE SET items = c.items + EXCLUDED.items;
+                        """
+
+UPSERT_METRICS = f"""
+                 INSERT INTO customer_metrics AS m (customerid, first_order, last_order, frequency, monetary)
+                 SELECT customerid, MIN(orderdate), MAX(orderdate), COUNT(*), COALESCE(SUM(total), 0)
+                 FROM ({NEW_ORDERS}) o
+                 WHERE customerid IS NOT NULL
+                 GROUP BY customerid
+                 ON CONFLICT (customerid) DO UPDATE SET
+                     first_order = LEAST(m.first_order, EXCLUDED.first_order),
+                     last_order  = GREATEST(m.last_order, EXCLUDED.last_order),
+                     frequency   = m.frequency + EXCLUDED.frequency,
+                     monetary    = m.monetary + EXCLUDED.monetary;
+                 """
+
+# Lieblingswerte nur für die betroffenen Kunden neu bestimmen
+UPDATE_FAVOURITES = """
+                    UPDATE customer_metrics m
+                    SET favourite_storeid  = (SELECT storeid FROM customer_store_orders s
+                                              WHERE s.customerid = m.customerid
+                                              ORDER BY s.orders DESC, s.storeid LIMIT 1),
+                        favourite_category = (SELECT category FROM customer_category_items c
+                                              WHERE c.customerid = m.customerid
+                                              ORDER BY c.items DESC, c.category LIMIT 1)
+                    WHERE m.customerid = ANY(%(customerids)s);
+                    """
+
+
+def update_customer_metrics(cursor, orders):
+    # orders: die gerade geladenen Bestellungen (orderid, customerid, orderdate)
+    if orders.empty:
+        return 0
+    params = {'orderids': orders['orderid'].astype(str).tolist(),
+              'start': pd.Timestamp(orders['orderdate'].min()).to_pydatetime(),
+              'end': pd.Timestamp(orders['orderdate'].max()).to_pydatetime()}
+    cursor.execute(UPSERT_STORE_ORDERS, params)
+    cursor.execute(UPSERT_CATEGORY_ITEMS, params)
+    cursor.execute(UPSERT_METRICS, params)
+
+    customerids = orders['customerid'].dropna().astype(str).unique().tolist()
+    cursor.execute(UPDATE_FAVOURITES, {'customerids': customerids})
+    return len(customerids)
@@ -0,0 +1,249 @@
+import json
+
+import dash
+from dash import html, dcc, dash_table, callback, Input, Output, State
+import dash_bootstrap_components as dbc
+import pandas as pd
+from db import Database
+import warmup
+
+dash.register_page(__name__, name='Customers', path='/customers')
+
+# Verbindungsparameter
+db_host = "localhost"
+db_name = "postgres"
+db_user = "postgres"
+db_password = "password"
+db_port = "5432"
+
+# Verbindung wird erst bei der ersten Abfrage aufgebaut
+db = Database(
+    host=db_host,
+    database=db_name,
+    user=db_user,
+    password=db_password,
+    port=db_port
+)
+
+PAGE_SIZE = 25
+
+# Sortierbare Spalten der Tabelle, passend zu den Indizes auf customer_metrics
+SORT_COLUMNS = {
+    'recency_days': 'm.last_order',
+    'frequency': 'm.frequency',
+    'monetary': 'm.monetary',
+    'customerid': 'm.customerid',
+}
+
+TABLE_COLUMNS = [
+    {'name': 'Customer ID', 'id': 'customerid'},
+    {'name': 'Recency (days)', 'id': 'recency_days'},
+    {'name': 'Orders', 'id': 'frequency'},
+    {'name': 'Revenue', 'id': 'monetary', 'type': 'numeric', 'format': {'specifier': ',.2f'}},
+    {'name': 'Avg. Order', 'id': 'avg_order', 'type': 'numeric', 'format': {'specifier': ',.2f'}},
+    {'name': 'Favourite Store', 'id': 'favourite_store'},
+    {'name': 'Favourite Category', 'id': 'favourite_category'},
+]
+
+
+def get_filter_options():
+    try:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT storeid, city FROM stores ORDER BY city, storeid;")
+            stores = cursor.fetchall()
+            cursor.execute("SELECT DISTINCT category FROM products WHERE category IS NOT NULL ORDER BY category;")
+            categories = [row[0] for row in cursor.fetchall()]
+        return stores, categories
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Filteroptionen: {e}")
+        return [], []
+
+
+# Keine Datenbankarbeit beim Import: die Filteroptionen werden im Hintergrund vorgeladen
+warmup.register('customers.filter_options', get_filter_options)
+
+
+def build_filter(search, store_id, category):
+    conditions = []
+    params = []
+    if search:
+        # Präfixsuche nutzt den text_pattern_ops-Index
+        conditions.append("m.customerid LIKE %s")
+        params.append(search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    if store_id:
+        conditions.append("m.favourite_storeid = %s")
+        params.append(store_id)
+    if category:
+        conditions.append("m.favourite_category = %s")
+        params.append(category)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+def count_customers(where, params):
+    with db.cursor() as cursor:
+        if not where:
+            # Ohne Filter reicht die Schätzung aus der Statistik, COUNT(*) über Millionen Zeilen ist zu teuer
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'customer_metrics';")
+        else:
+            cursor.execute(f"SELECT COUNT(*) FROM customer_metrics m {where};", params)
+        return max(int(cursor.fetchone()[0] or 0), 0)
+
+
+def keyset_condition(column, direction, key):
+    # Zeilen nach key = (Wert, customerid) in Sortierreihenfolge. Die erste Bedingung gibt dem Planer die
+    # Indexgrenze, die zweite trennt Gleichstände über customerid (in Gegenrichtung sortiert)
+    value, customerid = key
+    if column == SORT_COLUMNS['customerid']:
+        return f"m.customerid {'>' if direction == 'ASC' else '<'} %s", [customerid]
+    op = '>' if direction == 'ASC' else '<'
+    tie_op = '<' if direction == 'ASC' else '>'
+    return (f"{column} {op}= %s AND ({column} {op} %s OR m.customerid {tie_op} %s)",
+            [value, value, customerid])
+
+
+def get_customer_page(page, sort_by, search, store_id, category, page_keys=None):
+    # page_keys: {Seite: (Wert, customerid) der letzten Zeile} der schon gelesenen Seiten dieser Sortierung
+    # und Filter. Gelesen wird per Keyset ab dem Ende der nächstliegenden bekannten Seite davor; nur beim
+    # Sprung über unbekannte Seiten (z.B. "letzte Seite") bleibt ein OFFSET für die übersprungenen Seiten
+    where, params = build_filter(search, store_id, category)
+
+    column, direction = SORT_COLUMNS['monetary'], 'DESC'
+    if sort_by and sort_by[0]['column_id'] in SORT_COLUMNS:
+        column = SORT_COLUMNS[sort_by[0]['column_id']]
+        ascending = sort_by[0]['direction'] == 'asc'
+        # Recency aufsteigend = letzte Bestellung absteigend
+        if sort_by[0]['column_id'] == 'recency_days':
+            ascending = not ascending
+        direction = 'ASC' if ascending else 'DESC'
+    # Die Indizes sind (Spalte DESC, customerid): DESC liest sie vorwärts, ASC rückwärts, dafür muss
+    # customerid jeweils in Gegenrichtung sortiert sein
+    order_by = f"{column} {direction}"
+    if column != SORT_COLUMNS['customerid']:
+        order_by += f", m.customerid {'ASC' if direction == 'DESC' else 'DESC'}"
+
+    page_keys = page_keys or {}
+    known = [known_page for known_page in map(int, page_keys) if known_page < page]
+    page_where, page_params = where, list(params)
+    offset = page * PAGE_SIZE
+    if known:
+        start = max(known)
+        condition, condition_params = keyset_condition(column, direction, page_keys[str(start)])
+        page_where = f"{where} AND {condition}" if where else f"WHERE {condition}"
+        page_params += condition_params
+        offset = (page - start - 1) * PAGE_SIZE
+
+    # Recency bezieht sich auf die letzte Bestellung im Datenbestand, nicht auf heute; aus derselben
+    # Abfrage wie die Kennzahlen, damit beide nach neuen Ladevorgängen zusammenpassen (MAX über den Index)
+    sql_query = f"""
+                SELECT m.customerid, m.last_order, m.frequency, m.monetary,
+                       s.city, m.favourite_storeid, m.favourite_category,
+                       (SELECT MAX(last_order) FROM customer_metrics) as reference_date
+                FROM customer_metrics m
+                LEFT JOIN stores s ON s.storeid = m.favourite_storeid
+                {page_where}
+                ORDER BY {order_by}
+                LIMIT %s OFFSET %s;
+                """
+    with db.cursor() as cursor:
+        cursor.execute(sql_query, page_params + [PAGE_SIZE, offset])
+        results = cursor.fetchall()
+
+    # Schlüssel der letzten Zeile als Text (exakt für NUMERIC und TIMESTAMP), Postgres wandelt ihn zurück
+    last_key = None
+    if results:
+        last_row = results[-1]
+        sort_position = {'m.last_order': 1, 'm.frequency': 2, 'm.monetary': 3, 'm.customerid': 0}[column]
+        last_key = [str(last_row[sort_position]), last_row[0]]
+
+    df = pd.DataFrame(results, columns=["customerid", "last_order", "frequency", "monetary", "city",
+                                        "favourite_storeid", "favourite_category", "reference_date"])
+    df['monetary'] = df['monetary'].astype(float)
+    df['avg_order'] = df['monetary'] / df['frequency'].where(df['frequency'] > 0)
+    df['recency_days'] = (pd.to_datetime(df['reference_date']) - pd.to_datetime(df['last_order'])).dt.days
+    df['favourite_store'] = df['city'].fillna('') + ' (' + df['favourite_storeid'].fillna('') + ')'
+    return df, where, params, last_key
+
+
+def layout():
+    stores, categories = warmup.get('customers.filter_options', ([], []), timeout=5)
+    store_options = [{'label': f"{city} ({store_id})", 'value': store_id} for store_id, city in stores]
+    category_options = [{'label': category, 'value': category} for category in categories]
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([html.H3('Customers')], width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Input(id='customer-search', type='text', debounce=True,
+                          placeholder="Kunden-ID suchen", className='form-control')
+            ], width=4),
+            dbc.Col([
+                dcc.Dropdown(id='customer-store-filter', options=store_options, placeholder="Lieblings-Store")
+            ], width=4),
+            dbc.Col([
+                dcc.Dropdown(id='customer-category-filter', options=category_options,
+                             placeholder="Lieblings-Kategorie")
+            ], width=4),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                # Blättern und Sortieren laufen auf dem Server, im Browser liegt immer nur eine Seite
+                dash_table.DataTable(
+                    id='customer-table',
+                    columns=TABLE_COLUMNS,
+                    page_current=0,
+                    page_size=PAGE_SIZE,
+                    page_action='custom',
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[{'column_id': 'monetary', 'direction': 'desc'}],
+                    style_table={'overflowX': 'auto'},
+                ),
+                # Letzte Zeile jeder gelesenen Seite, für das Blättern per Keyset
+                dcc.Store(id='customer-page-keys'),
+            ], width=12),
+        ], style={'margin-top': '20px'}),
+        dbc.Row([
+            dbc.Col([
+                html.Div(id='customer-count', style={'margin-top': '10px'})
+            ], width=12),
+        ]),
+    ], className='container')
+
+
+@callback(
+    Output('customer-table', 'data'),
+    Output('customer-table', 'page_count'),
+    Output('customer-count', 'children'),
+    Output('customer-table', 'page_current'),
+    Output('customer-page-keys', 'data'),
+    Input('customer-table', 'page_current'),
+    Input('customer-table', 'sort_by'),
+    Input('customer-search', 'value'),
+    Input('customer-store-filter', 'value'),
+    Input('customer-category-filter', 'value'),
+    State('customer-page-keys', 'data')
+)
+def update_customer_table(page, sort_by, search, store_id, category, page_keys):
+    search = (search or '').strip()
+    # Neue Filter oder Sortierung beginnen wieder auf der ersten Seite, mit neuen Seitenschlüsseln
+    query = json.dumps([sort_by, search, store_id, category])
+    if 'customer-table.page_current' not in dash.ctx.triggered_prop_ids:
+        page = 0
+    if not page_keys or page_keys.get('query') != query:
+        page_keys = {'query': query, 'keys': {}}
+    try:
+        df, where, params, last_key = get_customer_page(page, sort_by, search, store_id, category,
+                                                        page_keys['keys'])
+        total = count_customers(where, params)
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Kundendaten: {e}")
+        return [], 0, "No data available.", page, page_keys
+
+    if last_key is not None:
+        page_keys['keys'][str(page)] = last_key
+    page_count = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    columns = [column['id'] for column in TABLE_COLUMNS]
+    return df[columns].to_dict('records'), page_count, f"{total:,} customers", page, page_keys
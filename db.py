@@ -0,0 +1,175 @@
+import contextvars
+import io
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+from psycopg2.extensions import QueryCanceledError
+from psycopg2.pool import ThreadedConnectionPool
+
+import cancellation
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # pyarrow ist optional, sonst parst pandas das COPY-Ergebnis
+    pa = None
+
+DATA_VERSION_QUERY = """
+                     SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+                     FROM pg_stat_user_tables
+                     WHERE relname = ANY(%s)
+                     ORDER BY relname;
+                     """
+
+# Standardgröße der Blöcke beim Streamen großer Ergebnisse
+STREAM_CHUNK_SIZE = 10000
+
+# Gemeinsamer Thread-Pool für unabhängige Abfragen innerhalb eines Callbacks
+QUERY_WORKERS = 8
+_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='query')
+
+
+def run_concurrently(*calls):
+    # calls: Funktionen ohne Argumente (z.B. functools.partial); Ergebnisse in derselben Reihenfolge.
+    # Jeder Aufruf läuft im Kontext des Aufrufers, damit seine Abfragen zum selben Abbruch-Scope gehören
+    futures = [_executor.submit(contextvars.copy_context().run, call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def copy_to_frame(connection, sql_query, params=None, parse_dates=()):
+    # Spaltenweiser Abruf: COPY liefert das Ergebnis als einen Puffer statt als Python-Tupel,
+    # Arrow (bzw. der C-Parser von pandas) wandelt ihn direkt in typisierte Spalten um
+    cursor = connection.cursor()
+    try:
+        query = cursor.mogrify(sql_query, params).decode().strip().rstrip(';')
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+
+    if pa is not None:
+        # Unquotierte leere Felder sind NULL, "" bleibt ein leerer String
+        convert_options = pa_csv.ConvertOptions(column_types={column: pa.timestamp('us') for column in parse_dates},
+                                                strings_can_be_null=True, quoted_strings_can_be_null=False)
+        table = pa_csv.read_csv(buffer, convert_options=convert_options)
+        return table.to_pandas()
+    return pd.read_csv(buffer, parse_dates=list(parse_dates))
+
+
+_cursor_ids = itertools.count()
+
+
+# Ältere Aufrufe desselben Scopes in anderen Worker-Prozessen, die connection.cancel() nicht erreicht
+CANCEL_OLDER_QUERY = """
+                     SELECT pg_cancel_backend(pid)
+                     FROM pg_stat_activity
+                     WHERE application_name = %s
+                     AND pid <> pg_backend_pid()
+                     AND xact_start < to_timestamp(%s);
+                     """
+
+
+def _tag_transaction(connection, query_scope):
+    # Gilt nur für die laufende Transaktion, der Pool setzt die Verbindung danach zurück
+    cursor = connection.cursor()
+    try:
+        if query_scope.claim_remote_cancel():
+            cursor.execute(CANCEL_OLDER_QUERY, (query_scope.application_name, query_scope.started))
+        cursor.execute("SELECT set_config('application_name', %s, true), set_config('statement_timeout', %s, true);",
+                       (query_scope.application_name, str(cancellation.QUERY_TIMEOUT_MS)))
+    finally:
+        cursor.close()
+
+
+class Database:
+    # Verbindungen werden erst bei der ersten Abfrage aufgebaut, nicht beim Import
+    def __init__(self, minconn=1, maxconn=QUERY_WORKERS, **params):
+        self.params = params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = None
+        self._lock = threading.Lock()
+        # getconn() wirft bei erschöpftem Pool, deshalb wird vorher auf einen freien Platz gewartet
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None or self._pool.closed:
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **self.params)
+            return self._pool
+
+    @contextmanager
+    def connection(self):
+        query_scope = cancellation.current()
+        with self._slots:
+            pool = self.pool
+            connection = pool.getconn()
+            try:
+                if query_scope is None:
+                    yield connection
+                else:
+                    with query_scope.attach(connection):
+                        _tag_transaction(connection, query_scope)
+                        try:
+                            yield connection
+                        except QueryCanceledError as e:
+                            # Abbruch aus einem anderen Prozess (pg_cancel_backend) kommt als "user request"
+                            if query_scope.superseded or 'statement timeout' not in str(e):
+                                raise cancellation.QueryCancelled(str(e)) from e
+                            # statement_timeout: eigene Ausnahme, damit Getter sie nicht als leeres Ergebnis cachen
+                            raise cancellation.QueryTimeout(str(e)) from e
+            finally:
+                pool.putconn(connection, close=connection.closed != 0)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def stream(self, sql_query, params=None, chunk_size=STREAM_CHUNK_SIZE, description=None):
+        # Serverseitiger (benannter) Cursor: es liegen nie mehr als chunk_size Zeilen im Speicher.
+        # description: optionale Liste, bekommt nach dem ersten Abruf cursor.description (auch ohne Zeilen)
+        with self.connection() as connection:
+            cursor = connection.cursor(name=f"stream_{next(_cursor_ids)}")
+            cursor.itersize = chunk_size
+            try:
+                cursor.execute(sql_query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if description is not None and not description:
+                        description.extend(cursor.description or ())
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                # Auch bei vorzeitigem Abbruch des Generators Cursor schließen und Transaktion beenden
+                try:
+                    cursor.close()
+                finally:
+                    connection.rollback()
+
+    def fetch_frame(self, sql_query, params=None, parse_dates=()):
+        with self.connection() as connection:
+            try:
+                return copy_to_frame(connection, sql_query, params, parse_dates)
+            finally:
+                connection.rollback()
+
+    def data_version(self, tables=('orders',)):
+        # Günstige Datenversion aus der Tabellenstatistik statt COUNT(*) über alle Zeilen
+        with self.cursor() as cursor:
+            cursor.execute(DATA_VERSION_QUERY, (list(tables),))
+            return tuple(cursor.fetchall())
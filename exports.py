@@ -0,0 +1,211 @@
+import csv
+import io
+import os
+import threading
+
+from flask import Response, abort, request, stream_with_context
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # ohne pyarrow nur CSV
+    pa = None
+
+from db import STREAM_CHUNK_SIZE
+
+# Download der Daten hinter den Ansichten unter /_export/<name>?format=csv|parquet&...
+# Die Zeilen kommen blockweise aus einem serverseitigen Cursor und werden direkt in die Antwort
+# geschrieben, auch große Exporte liegen nie vollständig im Speicher des Workers.
+
+# Höchstens so viele Exporte gleichzeitig pro Prozess, damit interaktive Callbacks Verbindungen
+# und Threads behalten
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', 2))
+# Zeilen pro Parquet-Row-Group bzw. pro geschriebenem CSV-Block
+EXPORT_CHUNK_SIZE = STREAM_CHUNK_SIZE * 5
+
+_exports = {}
+_slots = threading.BoundedSemaphore(EXPORT_CONCURRENCY)
+
+# Postgres-Typ (OID aus cursor.description) -> Arrow-Typ; alle übrigen Typen werden als Text exportiert
+_ARROW_TYPES = {
+    16: 'bool_',
+    20: 'int64',
+    21: 'int16',
+    23: 'int32',
+    700: 'float32',
+    701: 'float64',
+    1082: 'date32',
+}
+NUMERIC_OID = 1700
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+
+
+def register(name, db, query):
+    # db: Database, die Zeilen kommen blockweise aus Database.stream
+    # query: Funktion(request.args) -> (sql, params, Spaltennamen)
+    _exports[name] = (db, query)
+
+
+def register_frame(name, frame):
+    # frame: Funktion(request.args) -> DataFrame, für Daten, die nur im Speicher existieren
+    _exports[name] = (None, frame)
+
+
+def _frame_chunks(frame):
+    for start in range(0, len(frame), EXPORT_CHUNK_SIZE):
+        yield list(frame.iloc[start:start + EXPORT_CHUNK_SIZE].itertuples(index=False, name=None))
+
+
+def _csv_stream(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _DrainBuffer(io.RawIOBase):
+    # Nimmt die Bytes des Parquet-Writers auf und gibt sie nach jeder Row-Group an die Antwort weiter
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_field(name, column):
+    # Schema aus dem Spaltentyp statt aus dem ersten Block: eine dort leere Spalte oder kleinere
+    # Decimal-Präzision würde sonst spätere Blöcke scheitern lassen
+    if column.type_code in _ARROW_TYPES:
+        return pa.field(name, getattr(pa, _ARROW_TYPES[column.type_code])()), None
+    if column.type_code == TIMESTAMP_OID:
+        return pa.field(name, pa.timestamp('us')), None
+    if column.type_code == TIMESTAMPTZ_OID:
+        return pa.field(name, pa.timestamp('us', tz='UTC')), None
+    if column.type_code == NUMERIC_OID:
+        if column.precision and column.precision <= 38 and column.scale is not None:
+            return pa.field(name, pa.decimal128(column.precision, column.scale)), None
+        # NUMERIC ohne (Arrow-taugliche) Präzision, z.B. SUM über NUMERIC: Skala je Wert verschieden, als float64
+        return pa.field(name, pa.float64()), float
+    return pa.field(name, pa.string()), str
+
+
+def _query_tables(columns, chunks, description):
+    # description wird von Database.stream nach dem ersten Abruf gefüllt; Namen wie im CSV-Export
+    schema = None
+    for rows in chunks:
+        if schema is None:
+            fields, converters = zip(*(_arrow_field(name, column) for name, column in zip(columns, description)))
+            schema = pa.schema(fields)
+        arrays = []
+        for field, convert, values in zip(schema, converters, zip(*rows)):
+            if convert is not None:
+                values = [None if value is None else convert(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        yield pa.Table.from_arrays(arrays, schema=schema)
+    if schema is None and description:
+        yield pa.schema([_arrow_field(name, column)[0] for name, column in zip(columns, description)]).empty_table()
+
+
+def _frame_tables(frame):
+    # Schema aus dem ganzen DataFrame, geschrieben in Blöcken
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if not table.num_rows:
+        yield table
+        return
+    for batch in table.to_batches(max_chunksize=EXPORT_CHUNK_SIZE):
+        yield pa.Table.from_batches([batch], schema=table.schema)
+
+
+def _parquet_stream(columns, tables):
+    sink = _DrainBuffer()
+    writer = None
+    for table in tables:
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is None:
+        writer = pq.ParquetWriter(sink, pa.schema([(column, pa.string()) for column in columns]))
+    writer.close()
+    yield sink.drain()
+
+
+def _export(name):
+    if name not in _exports:
+        abort(404)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'parquet') or (fmt == 'parquet' and pa is None):
+        abort(400)
+
+    # Nicht warten: ist kein Platz frei, soll der Client es später erneut versuchen
+    if not _slots.acquire(blocking=False):
+        return Response("Too many exports running, please retry shortly.\n", status=429,
+                        headers={'Retry-After': '30'}, mimetype='text/plain')
+    released = []
+    release_lock = threading.Lock()
+
+    def release():
+        with release_lock:
+            if not released:
+                released.append(True)
+                _slots.release()
+
+    try:
+        db, source = _exports[name]
+        if db is None:
+            frame = source(request.args)
+            columns, chunks = list(frame.columns), _frame_chunks(frame)
+            tables = _frame_tables(frame) if fmt == 'parquet' else None
+        else:
+            sql_query, params, columns = source(request.args)
+            description = []
+            chunks = db.stream(sql_query, params, chunk_size=EXPORT_CHUNK_SIZE, description=description)
+            tables = _query_tables(columns, chunks, description) if fmt == 'parquet' else None
+    except Exception as e:
+        release()
+        print(f"Fehler beim Vorbereiten des Exports {name}: {e}")
+        abort(400)
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet'
+
+    def generate():
+        try:
+            if fmt == 'csv':
+                yield from _csv_stream(columns, chunks)
+            else:
+                yield from _parquet_stream(columns, tables)
+        finally:
+            if tables is not None:
+                tables.close()
+            chunks.close()
+            release()
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'})
+    # Abgebrochene Downloads: Platz auch dann freigeben, wenn der Generator nie gestartet wurde
+    response.call_on_close(release)
+    return response
+
+
+def init_exports(server):
+    server.add_url_rule('/_export/<name>', 'export', _export)
@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+
+from serialization import figure_to_json
+
+
+class FigureCache:
+    # Vorberechnete Figuren (als JSON) für Callbacks mit wenigen möglichen Eingaben
+    def __init__(self, name, build, keys, version, on_invalidate=None, version_ttl=60, max_size=256):
+        self.name = name
+        self.build = build
+        self.keys = keys
+        self.version = version
+        self.on_invalidate = on_invalidate
+        self.version_ttl = version_ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._current_version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        # Die Datenversion wird höchstens alle version_ttl Sekunden abgefragt
+        now = time.monotonic()
+        if now - self._checked_at < self.version_ttl:
+            return
+        self._checked_at = now
+        try:
+            version = self.version()
+        except Exception as e:
+            print(f"Fehler beim Abrufen der Datenversion für {self.name}: {e}")
+            return
+        if version != self._current_version:
+            with self._lock:
+                self._entries.clear()
+            if self._current_version is not None and self.on_invalidate is not None:
+                self.on_invalidate()
+            self._current_version = version
+
+    def _serialize(self, figures):
+        # orjson und Typed Arrays (serialization.py): schneller und kleiner als pio.to_json
+        if isinstance(figures, tuple):
+            return tuple(figure_to_json(fig) for fig in figures)
+        return figure_to_json(figures)
+
+    def _deserialize(self, payload):
+        if isinstance(payload, tuple):
+            return tuple(json.loads(item) for item in payload)
+        return json.loads(payload)
+
+    def _store(self, key):
+        payload = self._serialize(self.build(*key))
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = payload
+        return payload
+
+    def precompute(self):
+        self._checked_at = 0.0
+        self._check_version()
+        started = time.perf_counter()
+        keys = list(self.keys())
+        for key in keys:
+            self._store(key)
+        print(f"{self.name}: {len(keys)} Figuren in {time.perf_counter() - started:.2f}s vorberechnet")
+        return len(keys)
+
+    def get(self, *key):
+        self._check_version()
+        payload = self._entries.get(key)
+        if payload is None:
+            self.misses += 1
+            payload = self._store(key)
+        else:
+            self.hits += 1
+        return self._deserialize(payload)
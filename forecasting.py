@@ -0,0 +1,176 @@
+import hashlib
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bestellprognosen pro Store: ein leichtes Modell je Store (linearer Trend + Wochentagseffekt auf den
+# Tageswerten, dazu das Stundenprofil je Wochentag). Eine Anpassung ist ein kleines lstsq über höchstens
+# HISTORY_DAYS Zeilen und läuft im Hintergrund-Thread des Prozesses; ein Prozesspool kostete pro Refresh
+# mehr Start- und Importzeit als alle Anpassungen zusammen. Die Modelle werden pro Store mit einem
+# Fingerabdruck seiner Daten zwischengespeichert: bei neuen Daten werden nur die Stores neu angepasst,
+# deren Reihen sich geändert haben.
+
+DAILY_QUERY = """
+              SELECT storeid, ("orderdate"::timestamp - %(shift)s::interval)::date as day, COUNT(*)
+              FROM orders
+              WHERE storeid IS NOT NULL
+              GROUP BY storeid, day
+              ORDER BY storeid, day;
+              """
+
+HOURLY_QUERY = """
+               SELECT storeid,
+                      EXTRACT(isodow FROM "orderdate"::timestamp - %(shift)s::interval)::int - 1 as weekday,
+                      EXTRACT(hour FROM "orderdate"::timestamp - %(shift)s::interval)::int as hour,
+                      COUNT(*)
+               FROM orders
+               WHERE storeid IS NOT NULL
+               GROUP BY storeid, weekday, hour;
+               """
+
+# Angepasst werden nur die letzten HISTORY_DAYS Tage jedes Stores
+HISTORY_DAYS = 365
+
+
+def fit_store_model(store_id, days, counts, hourly):
+    # days: Tage als Ordinalzahlen (lückenlos), counts: Bestellungen pro Tag, hourly: 7×24 Bestellungen
+    days = days[-HISTORY_DAYS:]
+    counts = counts[-HISTORY_DAYS:].astype(float)
+    t = days - days[0]
+    weekdays = (days + 6) % 7  # date.fromordinal(1) ist ein Montag
+    design = np.column_stack([np.ones(len(t)), t] + [(weekdays == d).astype(float) for d in range(1, 7)])
+    coef, *_ = np.linalg.lstsq(design, counts, rcond=None)
+    residuals = counts - design @ coef
+    sigma = float(residuals.std()) if len(residuals) > 1 else 0.0
+
+    # Anteil jeder Stunde an den Bestellungen des Wochentags
+    totals = hourly.sum(axis=1, keepdims=True)
+    profile = np.divide(hourly, totals, out=np.full_like(hourly, 1 / 24, dtype=float), where=totals > 0)
+    return store_id, {'origin': int(days[0]), 'coef': coef, 'sigma': sigma, 'profile': profile}
+
+
+def predict_daily(model, days):
+    t = days - model['origin']
+    weekdays = (days + 6) % 7
+    coef = model['coef']
+    forecast = coef[0] + coef[1] * t + np.where(weekdays > 0, coef[np.clip(weekdays + 1, 2, 7)], 0.0)
+    return np.maximum(forecast, 0.0)
+
+
+class StoreForecaster:
+    def __init__(self, db, horizon_days=28, time_shift='0 hours', version_ttl=60):
+        self.db = db
+        self.horizon_days = horizon_days
+        self.time_shift = time_shift
+        self.version_ttl = version_ttl
+        self._models = {}
+        self._fingerprints = {}
+        self._last_day = None
+        self._version = None
+        self._checked_at = 0.0
+        self._refreshing = threading.Lock()
+
+    def _load_series(self):
+        params = {'shift': self.time_shift}
+        daily = self.db.fetch_frame(DAILY_QUERY, params, parse_dates=['day'])
+        daily.columns = ['storeid', 'day', 'orders']
+        hourly = self.db.fetch_frame(HOURLY_QUERY, params)
+        hourly.columns = ['storeid', 'weekday', 'hour', 'orders']
+
+        series = {}
+        hourly_by_store = {store_id: group for store_id, group in hourly.groupby('storeid')}
+        for store_id, group in daily.groupby('storeid'):
+            ordinals = np.array([day.toordinal() for day in group['day']], dtype=np.int64)
+            days = np.arange(ordinals.min(), ordinals.max() + 1)
+            counts = np.zeros(len(days), dtype=np.int64)
+            counts[ordinals - days[0]] = group['orders'].to_numpy()
+            profile = np.zeros((7, 24), dtype=np.int64)
+            store_hourly = hourly_by_store.get(store_id)
+            if store_hourly is not None:
+                np.add.at(profile, (store_hourly['weekday'].to_numpy(), store_hourly['hour'].to_numpy()),
+                          store_hourly['orders'].to_numpy())
+            series[store_id] = (days, counts, profile)
+        return series
+
+    def refresh(self):
+        # Nur bei neuer Datenversion neu laden; angepasst werden nur Stores mit geänderten Reihen
+        with self._refreshing:
+            self._checked_at = time.monotonic()
+            version = self.db.data_version()
+            if version == self._version:
+                return 0
+            started = time.perf_counter()
+            series = self._load_series()
+
+            fingerprints = {}
+            changed = []
+            for store_id, (days, counts, profile) in series.items():
+                fingerprint = hashlib.sha1(days[:1].tobytes() + counts.tobytes() + profile.tobytes()).hexdigest()
+                fingerprints[store_id] = fingerprint
+                if self._fingerprints.get(store_id) != fingerprint:
+                    changed.append(store_id)
+
+            models = {store_id: model for store_id, model in self._models.items() if store_id in series}
+            models.update(fit_store_model(store_id, *series[store_id]) for store_id in changed)
+
+            self._models = models
+            self._fingerprints = fingerprints
+            self._last_day = max((days[-1] for days, _, _ in series.values()), default=None)
+            self._version = version
+            print(f"Prognosen: {len(changed)} von {len(series)} Stores in "
+                  f"{time.perf_counter() - started:.2f}s neu angepasst")
+            return len(changed)
+
+    def _refresh_in_background(self):
+        # Abfragen bekommen sofort die vorhandenen Prognosen, neu angepasst wird im Hintergrund
+        if time.monotonic() - self._checked_at < self.version_ttl or self._refreshing.locked():
+            return
+        self._checked_at = time.monotonic()
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Fehler beim Aktualisieren der Prognosen: {e}")
+
+        threading.Thread(target=run, name='forecast-refresh', daemon=True).start()
+
+    def forecast_days(self):
+        if self._last_day is None:
+            return np.array([], dtype=np.int64)
+        return np.arange(self._last_day + 1, self._last_day + 1 + self.horizon_days)
+
+    def daily_forecast(self, store_ids=None):
+        # DataFrame mit Store ID, Date, Orders, Lower, Upper (grobes 95%-Band aus den Residuen)
+        self._refresh_in_background()
+        days = self.forecast_days()
+        frames = []
+        for store_id, model in self._models.items():
+            if store_ids is not None and store_id not in store_ids:
+                continue
+            forecast = predict_daily(model, days)
+            frames.append(pd.DataFrame({
+                'Store ID': store_id,
+                'Date': [pd.Timestamp.fromordinal(int(day)) for day in days],
+                'Orders': forecast,
+                'Lower': np.maximum(forecast - 1.96 * model['sigma'], 0.0),
+                'Upper': forecast + 1.96 * model['sigma'],
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['Store ID', 'Date', 'Orders', 'Lower', 'Upper'])
+        return pd.concat(frames, ignore_index=True)
+
+    def hourly_forecast(self, store_ids=None, days=7):
+        # Erwartete Bestellungen je Wochentag und Stunde für die nächsten days Tage (Summe der Stores)
+        self._refresh_in_background()
+        forecast_days = self.forecast_days()[:days]
+        weekdays = (forecast_days + 6) % 7
+        expected = np.zeros((7, 24))
+        for store_id, model in self._models.items():
+            if store_ids is not None and store_id not in store_ids:
+                continue
+            daily = predict_daily(model, forecast_days)
+            np.add.at(expected, weekdays, daily[:, None] * model['profile'][weekdays])
+        return expected
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+# gunicorn -c gunicorn.conf.py Frontend:server
+# The segment dataset is built once by a sidecar process and shared by all workers (see segments.py)
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+
+SEGMENT_REFRESH_SECONDS = int(os.environ.get('SEGMENT_REFRESH_SECONDS', 3600))
+
+_sidecar = None
+
+
+def when_ready(server):
+    global _sidecar
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'segments.py')
+    _sidecar = subprocess.Popen([sys.executable, script, '--interval', str(SEGMENT_REFRESH_SECONDS)])
+    server.log.info(f"Segment sidecar started (pid {_sidecar.pid})")
+
+
+def on_exit(server):
+    if _sidecar is not None:
+        _sidecar.terminate()
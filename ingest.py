@@ -0,0 +1,113 @@
+import argparse
+import glob
+import io
+import os
+
+import pandas as pd
+
+from catchment import refresh_catchment
+from copurchase import build_or_update
+from customer_metrics import update_customer_metrics
+from sketches import update_store_day_sketches, rebuild_sketches
+from db import Database
+from live import notify_orders
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+ORDER_COLUMNS = ['orderid', 'customerid', 'storeid', 'orderdate', 'nitems', 'total']
+ORDER_ITEM_COLUMNS = ['orderid', 'sku', 'orderdate']
+
+
+def apply_migrations(db):
+    # Jede Migration läuft in einer eigenen Transaktion und wird nur einmal angewendet
+    with db.cursor() as cursor:
+        cursor.execute("""
+                       CREATE TABLE IF NOT EXISTS schema_migrations (
+                           name       TEXT PRIMARY KEY,
+                           applied_at TIMESTAMP NOT NULL DEFAULT now()
+                       );
+                       """)
+        cursor.execute("SELECT name FROM schema_migrations;")
+        applied = {row[0] for row in cursor.fetchall()}
+
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql'))):
+        name = os.path.basename(path)
+        if name in applied:
+            continue
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        with db.cursor() as cursor:
+            cursor.execute(sql)
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s);", (name,))
+        print(f"Migration angewendet: {name}")
+
+
+def ensure_partitions(cursor, start_date, end_date):
+    # Fehlende Monatspartitionen vor dem Einfügen anlegen
+    cursor.execute("SELECT ensure_order_partitions(%s, %s);", (start_date, end_date))
+    return cursor.fetchone()[0]
+
+
+def copy_frame(cursor, df, table, columns):
+    buffer = io.StringIO()
+    df[columns].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def load_orders(db, orders, order_items):
+    orders = orders.rename(columns=str.lower)
+    order_items = order_items.rename(columns=str.lower)
+    if orders.empty:
+        return 0
+
+    orders['orderdate'] = pd.to_datetime(orders['orderdate'])
+    # orderitems wird über orderdate mitpartitioniert
+    order_items = order_items.merge(orders[['orderid', 'orderdate']], on='orderid')
+
+    with db.cursor() as cursor:
+        created = ensure_partitions(cursor, orders['orderdate'].min().date(), orders['orderdate'].max().date())
+        copy_frame(cursor, orders, 'orders', ORDER_COLUMNS)
+        copy_frame(cursor, order_items, 'orderitems', ORDER_ITEM_COLUMNS)
+        # Kundenkennzahlen und Tagesskizzen in derselben Transaktion um die neuen Bestellungen ergänzen
+        update_customer_metrics(cursor, orders)
+        update_store_day_sketches(cursor, orders)
+        # Live-Ansichten: Bestellungen pro Store und Stunde, zugestellt beim Commit
+        notify_orders(cursor, orders)
+    print(f"{len(orders)} Bestellungen und {len(order_items)} Positionen geladen, {created} neue Partition(en)")
+    return len(orders)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrationen anwenden und Bestellungen laden')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--database', default='postgres')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--port', default='5432')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate')
+    orders_parser = subparsers.add_parser('orders')
+    orders_parser.add_argument('orders_csv')
+    orders_parser.add_argument('order_items_csv')
+    subparsers.add_parser('copurchase')
+    subparsers.add_parser('catchment')
+    subparsers.add_parser('sketches')
+    args = parser.parse_args()
+
+    database = Database(host=args.host, database=args.database, user=args.user, password=args.password,
+                        port=args.port)
+    if args.command == 'migrate':
+        apply_migrations(database)
+    elif args.command == 'copurchase':
+        build_or_update(database)
+    elif args.command == 'catchment':
+        refresh_catchment(database)
+    elif args.command == 'sketches':
+        rebuild_sketches(database)
+    else:
+        orders = pd.read_csv(args.orders_csv)
+        order_items = pd.read_csv(args.order_items_csv)
+        load_orders(database, orders, order_items)
+        # Der Co-Purchase-Index wird nur um die gerade geladenen Bestellungen ergänzt, ohne sie erneut zu lesen
+        build_or_update(database, orders, order_items)
@@ -0,0 +1,29 @@
+import importlib
+import threading
+
+# Schwere Abhängigkeiten erst beim ersten Zugriff laden: Worker starten schneller, und Seiten,
+# die niemand öffnet, kosten keine Importzeit. Budget: python benchmarks/import_time.py
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Nur für Attribute, die das Objekt selbst nicht hat, also alles außer _name/_module
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name}{'' if self._module is None else ' (geladen)'}>"
+
+
+def lazy_import(name):
+    # Ersetzt "import name as alias" auf Modulebene; importiert wird beim ersten Attributzugriff
+    return LazyModule(name)
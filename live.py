@@ -0,0 +1,189 @@
+import collections
+import datetime
+import json
+import select
+import threading
+import time
+import uuid
+
+import pandas as pd
+import psycopg2
+
+# Live-Modus für die heutigen Bestellungen: ingest.py meldet jede geladene Charge per NOTIFY
+# (Bestellungen pro Store und Stunde), ein Listener-Thread pro Prozess hält daraus Zähler für heute.
+# Die Diagramme fragen per dcc.Interval nur die seit ihrer letzten Version geänderten Zähler ab,
+# der Tag wird nie erneut aus der Datenbank gelesen.
+
+CHANNEL = 'orders_live'
+# NOTIFY-Nutzlast ist auf 8000 Bytes begrenzt
+MAX_PAYLOAD_BYTES = 7000
+# Nur Bestellungen der letzten Tage melden, historische Ladevorgänge erzeugen keine Ereignisse
+NOTIFY_MAX_AGE = pd.Timedelta(days=2)
+# So viele Änderungsschritte werden vorgehalten; wer weiter zurückliegt, bekommt den ganzen Tag
+HISTORY_LENGTH = 1000
+RECONNECT_SECONDS = 5
+
+BOOTSTRAP_QUERY = """
+                  SELECT storeid, EXTRACT(hour FROM orderdate - %(shift)s::interval)::int as hour, COUNT(*)
+                  FROM orders
+                  WHERE storeid IS NOT NULL
+                  AND orderdate >= %(day)s::timestamp + %(shift)s::interval
+                  AND orderdate < %(day)s::timestamp + %(shift)s::interval + INTERVAL '1 day'
+                  GROUP BY storeid, hour;
+                  """
+
+
+def notify_orders(cursor, orders):
+    # Vom Loader in der Transaktion der Bestellungen aufgerufen: NOTIFY wird erst beim Commit zugestellt
+    orderdate = pd.to_datetime(orders['orderdate'])
+    recent = orders[orderdate >= pd.Timestamp.now() - NOTIFY_MAX_AGE].dropna(subset=['storeid'])
+    if recent.empty:
+        return 0
+    hours = pd.to_datetime(recent['orderdate']).dt.strftime('%Y-%m-%dT%H')
+    counts = recent.groupby([recent['storeid'].astype(str), hours]).size()
+    cursor.execute("SELECT txid_current();")
+    txid = cursor.fetchone()[0]
+
+    # Die Transaktions-ID erlaubt dem Listener, bereits im Startzustand enthaltene Chargen zu überspringen
+    sent = 0
+    batch = []
+    size = 0
+    for (store_id, hour), count in counts.items():
+        batch.append([store_id, hour, int(count)])
+        size += len(store_id) + 32
+        if size >= MAX_PAYLOAD_BYTES:
+            cursor.execute("SELECT pg_notify(%s, %s);", (CHANNEL, json.dumps({'txid': txid, 'counts': batch})))
+            sent += 1
+            batch = []
+            size = 0
+    if batch:
+        cursor.execute("SELECT pg_notify(%s, %s);", (CHANNEL, json.dumps({'txid': txid, 'counts': batch})))
+        sent += 1
+    return sent
+
+
+def _visible(txid, snapshot):
+    # Entspricht txid_visible_in_snapshot(): "xmin:xmax:xip,xip"
+    xmin, xmax, xip = snapshot.split(':')
+    if txid < int(xmin):
+        return True
+    return txid < int(xmax) and str(txid) not in xip.split(',')
+
+
+class LiveCounters:
+    def __init__(self, db, time_shift_hours=0):
+        self.db = db
+        self.time_shift = datetime.timedelta(hours=time_shift_hours)
+        self._counts = {}
+        self._day = None
+        self._snapshot = None
+        # Version: (Epoche, Schritt); eine neue Epoche (Tageswechsel, Neuverbindung) erzwingt den ganzen Tag.
+        # Die Epoche ist eine zufällige ID und kein Zähler: jeder gunicorn-Worker hat eigene Zähler, und
+        # ein Client, dessen nächster Abruf bei einem anderen Worker landet, darf dessen Version nie treffen
+        self._epoch = uuid.uuid4().hex
+        self._step = 0
+        self._history = collections.deque(maxlen=HISTORY_LENGTH)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        # Erst beim ersten Abruf, nicht beim Import; ein Listener pro Prozess
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='live-listener', daemon=True)
+                self._thread.start()
+
+    def _today(self):
+        return (datetime.datetime.now() - self.time_shift).date()
+
+    def _reset(self, day, counts, snapshot):
+        with self._lock:
+            self._day = day
+            self._counts = counts
+            self._snapshot = snapshot
+            self._epoch = uuid.uuid4().hex
+            self._step = 0
+            self._history.clear()
+
+    def _bootstrap(self, connection):
+        # Startzustand in einer Transaktion mit festem Snapshot; danach eintreffende Meldungen
+        # werden anhand ihrer Transaktions-ID gegen diesen Snapshot abgeglichen
+        day = self._today()
+        connection.autocommit = False
+        connection.set_session(isolation_level='REPEATABLE READ')
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT txid_current_snapshot()::text;")
+                snapshot = cursor.fetchone()[0]
+                cursor.execute(BOOTSTRAP_QUERY, {'day': day,
+                                                 'shift': f"{int(self.time_shift.total_seconds())} seconds"})
+                counts = {(store_id, hour): count for store_id, hour, count in cursor.fetchall()}
+            connection.commit()
+        finally:
+            connection.set_session(isolation_level='DEFAULT', autocommit=True)
+        self._reset(day, counts, snapshot)
+
+    def _apply(self, payload):
+        changed = set()
+        with self._lock:
+            if self._snapshot is not None and _visible(payload['txid'], self._snapshot):
+                return
+            for store_id, hour, count in payload['counts']:
+                timestamp = datetime.datetime.fromisoformat(hour) - self.time_shift
+                if timestamp.date() != self._day:
+                    continue
+                key = (store_id, timestamp.hour)
+                self._counts[key] = self._counts.get(key, 0) + count
+                changed.add(key)
+            if changed:
+                self._step += 1
+                self._history.append((self._step, changed))
+
+    def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(**self.db.params)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL};")
+                self._bootstrap(connection)
+                while True:
+                    ready = select.select([connection], [], [], RECONNECT_SECONDS) != ([], [], [])
+                    if self._today() != self._day:
+                        # Tageswechsel: neuer Tag ohne Bestellungen, alle folgenden Meldungen zählen
+                        self._reset(self._today(), {}, None)
+                    if ready:
+                        connection.poll()
+                        while connection.notifies:
+                            self._apply(json.loads(connection.notifies.pop(0).payload))
+            except Exception as e:
+                print(f"Fehler im Live-Listener: {e}")
+                time.sleep(RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def snapshot(self, store_ids=None):
+        # (Version, {(Store ID, Stunde): Bestellungen}) für den ganzen Tag
+        self.start()
+        with self._lock:
+            counts = {key: count for key, count in self._counts.items() if store_ids is None or key[0] in store_ids}
+            return [self._epoch, self._step], counts
+
+    def changes_since(self, version, store_ids=None):
+        # (Version, geänderte Zähler) oder (Version, None), wenn der Client den ganzen Tag neu braucht
+        self.start()
+        with self._lock:
+            current = [self._epoch, self._step]
+            if not version or version[0] != self._epoch:
+                return current, None
+            if version[1] == self._step:
+                return current, {}
+            if not self._history or version[1] < self._history[0][0] - 1:
+                return current, None
+            keys = set()
+            for step, changed in self._history:
+                if step > version[1]:
+                    keys |= changed
+            return current, {key: self._counts[key] for key in keys if store_ids is None or key[0] in store_ids}
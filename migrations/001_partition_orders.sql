@@ -0,0 +1,82 @@
+-- Monatliche Range-Partitionierung von orders und orderitems nach orderdate.
+-- orderitems bekommt orderdate als Partitionsschlüssel, damit beide Tabellen dieselben Monate teilen.
+-- Bereichsabfragen lesen nur die betroffenen Monate, alte Monate lassen sich per DETACH archivieren.
+
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER TABLE orderitems RENAME TO orderitems_unpartitioned;
+
+CREATE TABLE orders (
+    orderid    VARCHAR(255) NOT NULL,
+    customerid VARCHAR(255),
+    storeid    VARCHAR(255),
+    orderdate  TIMESTAMP    NOT NULL,
+    nitems     INT,
+    total      FLOAT,
+    PRIMARY KEY (orderid, orderdate)
+) PARTITION BY RANGE (orderdate);
+
+CREATE TABLE orderitems (
+    orderid   VARCHAR(255) NOT NULL,
+    sku       VARCHAR(255) NOT NULL,
+    orderdate TIMESTAMP    NOT NULL
+) PARTITION BY RANGE (orderdate);
+
+-- Legt fehlende Monatspartitionen für beide Tabellen an (idempotent, wird vom Loader aufgerufen)
+CREATE OR REPLACE FUNCTION ensure_order_partitions(from_date DATE, to_date DATE)
+RETURNS INT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::date;
+    month_end   DATE;
+    created     INT  := 0;
+    suffix      TEXT;
+BEGIN
+    WHILE month_start <= to_date LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        suffix := to_char(month_start, '"y"YYYY"m"MM');
+        IF to_regclass('orders_' || suffix) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF orders FOR VALUES FROM (%L) TO (%L)',
+                           'orders_' || suffix, month_start, month_end);
+            created := created + 1;
+        END IF;
+        IF to_regclass('orderitems_' || suffix) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF orderitems FOR VALUES FROM (%L) TO (%L)',
+                           'orderitems_' || suffix, month_start, month_end);
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hängt einen Monat aus (z.B. zum Archivieren); die Daten bleiben als eigenständige Tabellen erhalten
+CREATE OR REPLACE FUNCTION detach_order_partition(month DATE)
+RETURNS VOID AS $$
+DECLARE
+    suffix TEXT := to_char(date_trunc('month', month), '"y"YYYY"m"MM');
+BEGIN
+    EXECUTE format('ALTER TABLE orders DETACH PARTITION %I', 'orders_' || suffix);
+    EXECUTE format('ALTER TABLE orderitems DETACH PARTITION %I', 'orderitems_' || suffix);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitionen für den vorhandenen Datenbestand anlegen und Daten übernehmen
+SELECT ensure_order_partitions(MIN(orderdate)::date, MAX(orderdate)::date)
+FROM orders_unpartitioned;
+
+INSERT INTO orders (orderid, customerid, storeid, orderdate, nitems, total)
+SELECT orderid, customerid, storeid, orderdate::timestamp, nitems, total
+FROM orders_unpartitioned;
+
+INSERT INTO orderitems (orderid, sku, orderdate)
+SELECT oi.orderid, oi.sku, o.orderdate::timestamp
+FROM orderitems_unpartitioned oi
+JOIN orders_unpartitioned o ON o.orderid = oi.orderid;
+
+-- BRIN-Indizes: wenige Seiten groß, passend für zeitlich geordnet eingefügte Daten
+CREATE INDEX orders_orderdate_brin ON orders USING BRIN (orderdate);
+CREATE INDEX orderitems_orderdate_brin ON orderitems USING BRIN (orderdate);
+CREATE INDEX orders_storeid_idx ON orders (storeid);
+CREATE INDEX orderitems_orderid_idx ON orderitems (orderid);
+
+ANALYZE orders;
+ANALYZE orderitems;
@@ -0,0 +1,63 @@
+-- Kennzahlen pro Kunde (Recency, Frequency, Monetary, Lieblings-Store/-Kategorie).
+-- Wird einmal aus allen Bestellungen befüllt und danach vom Loader nur um neue Bestellungen ergänzt
+-- (siehe customer_metrics.py). Recency wird beim Lesen aus last_order berechnet.
+
+CREATE TABLE customer_metrics (
+    customerid         VARCHAR(255) PRIMARY KEY,
+    first_order        TIMESTAMP      NOT NULL,
+    last_order         TIMESTAMP      NOT NULL,
+    frequency          INT            NOT NULL,
+    monetary           NUMERIC(12, 2) NOT NULL,
+    favourite_storeid  VARCHAR(255),
+    favourite_category VARCHAR(255)
+);
+
+-- Zähler, aus denen die Lieblingswerte ohne Rückgriff auf alle Bestellungen neu bestimmt werden
+CREATE TABLE customer_store_orders (
+    customerid VARCHAR(255) NOT NULL,
+    storeid    VARCHAR(255) NOT NULL,
+    orders     INT          NOT NULL,
+    PRIMARY KEY (customerid, storeid)
+);
+
+CREATE TABLE customer_category_items (
+    customerid VARCHAR(255) NOT NULL,
+    category   VARCHAR(255) NOT NULL,
+    items      INT          NOT NULL,
+    PRIMARY KEY (customerid, category)
+);
+
+INSERT INTO customer_store_orders (customerid, storeid, orders)
+SELECT customerid, storeid, COUNT(*)
+FROM orders
+WHERE customerid IS NOT NULL AND storeid IS NOT NULL
+GROUP BY customerid, storeid;
+
+INSERT INTO customer_category_items (customerid, category, items)
+SELECT o.customerid, p.category, COUNT(*)
+FROM orders o
+JOIN orderitems oi ON oi.orderid = o.orderid AND oi.orderdate = o.orderdate
+JOIN products p ON p.sku = oi.sku
+WHERE o.customerid IS NOT NULL AND p.category IS NOT NULL
+GROUP BY o.customerid, p.category;
+
+INSERT INTO customer_metrics (customerid, first_order, last_order, frequency, monetary,
+                              favourite_storeid, favourite_category)
+SELECT o.customerid, MIN(o.orderdate), MAX(o.orderdate), COUNT(*), COALESCE(SUM(o.total), 0),
+       (SELECT storeid FROM customer_store_orders s
+        WHERE s.customerid = o.customerid ORDER BY s.orders DESC, s.storeid LIMIT 1),
+       (SELECT category FROM customer_category_items c
+        WHERE c.customerid = o.customerid ORDER BY c.items DESC, c.category LIMIT 1)
+FROM orders o
+WHERE o.customerid IS NOT NULL
+GROUP BY o.customerid;
+
+-- Sortierte Seiten und Suche laufen über Indizes statt über Sortierungen der ganzen Tabelle
+CREATE INDEX customer_metrics_customerid_prefix_idx ON customer_metrics (customerid text_pattern_ops);
+CREATE INDEX customer_metrics_last_order_idx ON customer_metrics (last_order DESC, customerid);
+CREATE INDEX customer_metrics_frequency_idx ON customer_metrics (frequency DESC, customerid);
+CREATE INDEX customer_metrics_monetary_idx ON customer_metrics (monetary DESC, customerid);
+CREATE INDEX customer_metrics_store_idx ON customer_metrics (favourite_storeid, monetary DESC);
+CREATE INDEX customer_metrics_category_idx ON customer_metrics (favourite_category, monetary DESC);
+
+ANALYZE customer_metrics;
@@ -0,0 +1,12 @@
+-- Nächster und zweitnächster Store je Kunde, berechnet vom Batch-Job in catchment.py
+-- (BallTree über die Store-Koordinaten). Der Job ersetzt den Inhalt vollständig.
+
+CREATE TABLE customer_catchment (
+    customerid      VARCHAR(255) PRIMARY KEY,
+    nearest_storeid VARCHAR(255) NOT NULL,
+    nearest_miles   REAL         NOT NULL,
+    second_storeid  VARCHAR(255),
+    second_miles    REAL
+);
+
+CREATE INDEX customer_catchment_nearest_idx ON customer_catchment (nearest_storeid, nearest_miles);
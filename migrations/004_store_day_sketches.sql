@@ -0,0 +1,10 @@
+-- Tagesaggregate pro Store mit HyperLogLog-Skizze der Kunden (Format siehe sketches.py).
+-- Befüllt mit "python ingest.py sketches", danach vom Loader für neue Bestellungen ergänzt.
+
+CREATE TABLE store_day_sketches (
+    storeid       VARCHAR(255) NOT NULL,
+    day           DATE         NOT NULL,
+    orders        INT          NOT NULL,
+    customers_hll BYTEA        NOT NULL,
+    PRIMARY KEY (storeid, day)
+);
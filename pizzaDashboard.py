@@ -1,11 +1,19 @@
-import psycopg2 as pg
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
-import plotly.express as px
+from dash import dcc, html, ClientsideFunction, Patch
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from lazy_imports import lazy_import
 import pandas as pd
-import pytz
 import dash_bootstrap_components as dbc
+from db import Database
+from cancellation import cancellable, tab_store, TAB_STORE
+from figure_cache import FigureCache
+from aggregations import hourly_order_counts
+from forecasting import StoreForecaster
+from live import LiveCounters
+import warmup
+import exports
+import sampling
 
 # Verbindungsparameter
 db_host = "localhost"
@@ -14,12 +22,11 @@ db_user = "postgres"
 db_password = "password"
 db_port = "5432"
 
-# Verbindung zur Datenbank herstellen
-connection = pg.connect(host=db_host, database=db_name, user=db_user, password=db_password, port=db_port,
-                        client_encoding='utf-8')
-cursor = connection.cursor()
+# Verbindung wird erst bei der ersten Abfrage aufgebaut
+db = Database(host=db_host, database=db_name, user=db_user, password=db_password, port=db_port,
+              client_encoding='utf-8')
 
-berlin_tz = pytz.timezone('Europe/Berlin')
+px = lazy_import('plotly.express')
 
 def get_order_date_range(cursor):
     try:
@@ -33,38 +40,59 @@ def get_order_date_range(cursor):
         return result[0], result[1]
     except Exception as e:
         print(f"Fehler beim Abrufen des Datumsbereichs: {e}")
-        connection.rollback()
+        cursor.connection.rollback()
         return None, None
 
-def fetch_orders(cursor, start_date, end_date):
+ORDERS_QUERY = """
+               SELECT "orderid", "orderdate"::timestamp - INTERVAL '9 hours' as "orderdate"
+               FROM orders
+               WHERE "orderdate" >= %s AND "orderdate" <= %s;
+               """
+
+def count_orders_per_hour(start_date, end_date):
+    # Streamt die Bestellungen blockweise über einen serverseitigen Cursor
     try:
-        sql_query = f"""
-                    SELECT "orderid", "orderdate"::timestamp - INTERVAL '9 hours' as "orderdate"
-                    FROM orders
-                    WHERE "orderdate" >= '{start_date}' AND "orderdate" <= '{end_date}';
-                    """
-        cursor.execute(sql_query)
-        result = cursor.fetchall()
-        df = pd.DataFrame(result, columns=["orderid", "orderdate"])
-        df["orderdate"] = pd.to_datetime(df["orderdate"], errors='coerce')
-        return df
+        return hourly_order_counts(db.stream(ORDERS_QUERY, (start_date, end_date)))
     except Exception as e:
         print(f"Fehler beim Abrufen der Bestellungen: {e}")
-        connection.rollback()
         return pd.DataFrame()
 
+# Vorschau: gleiche Zeilen wie ORDERS_QUERY, aus einer Blockstichprobe (siehe sampling.py)
+ORDERS_SAMPLE_QUERY = f"""
+                      SELECT EXTRACT(hour FROM "orderdate"::timestamp - INTERVAL '9 hours')::int as hour, 1 as value,
+                             {sampling.page_columns()}
+                      FROM orders {sampling.tablesample()}
+                      WHERE "orderdate" >= %s AND "orderdate" <= %s
+                      """
+
+def estimate_orders_per_hour(start_date, end_date):
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(sampling.estimate_query(ORDERS_SAMPLE_QUERY, ['hour']), (start_date, end_date))
+            results = cursor.fetchall()
+    except Exception as e:
+        print(f"Fehler beim Schätzen der Bestellungen: {e}")
+        return pd.DataFrame()
+    estimate = pd.DataFrame(results, columns=['orderdate', 'count', 'stderr']).astype(
+        {'orderdate': int, 'count': float, 'stderr': float})
+    estimate = estimate.set_index('orderdate').reindex(range(24), fill_value=0.0).rename_axis('orderdate')
+    estimate['margin'] = sampling.Z_95 * estimate['stderr']
+    return estimate.reset_index()
+
 def get_store_data(cursor, year):
     if year is None:
-        year = pd.Timestamp.now().year
+        year = YEARS[-1]
 
     try:
-        sql_query = f"""
+        # Bereichsbedingung statt EXTRACT(YEAR ...), damit nur die Partitionen des Jahres gelesen werden
+        sql_query = """
                     SELECT s."latitude", s."longitude", s."city", COUNT(o."orderid") as order_count
                     FROM stores s
-                    LEFT JOIN orders o ON s."storeid" = o."storeid" AND EXTRACT(YEAR FROM o."orderdate"::date) = {year}
+                    LEFT JOIN orders o ON s."storeid" = o."storeid"
+                        AND o."orderdate" >= make_date(%(year)s, 1, 1) AND o."orderdate" < make_date(%(year)s + 1, 1, 1)
                     GROUP BY s."latitude", s."longitude", s."city";
                     """
-        cursor.execute(sql_query)
+        cursor.execute(sql_query, {'year': int(year)})
         results = cursor.fetchall()
         store_data = pd.DataFrame(results, columns=["lat", "lon", "City", "Order Count"])
         store_data["Order Count"] = pd.to_numeric(store_data["Order Count"], errors='coerce').fillna(0)
@@ -72,91 +100,216 @@ def get_store_data(cursor, year):
         return store_data
     except Exception as e:
         print(f"Fehler beim Abrufen von Daten der Stores: {e}")
-        connection.rollback()
+        cursor.connection.rollback()
         return pd.DataFrame()
 
+# Jahre im Dropdown, zugleich der Eingaberaum für den Figuren-Cache
+YEARS = list(range(2020, 2023))
+
 def create_year_dropdown():
-    current_year = pd.Timestamp.now().year
-    years = list(range(2020, 2023))
-    dropdown_options = [{"label": str(year), "value": year} for year in years]
+    dropdown_options = [{"label": str(year), "value": year} for year in YEARS]
     dropdown = dcc.Dropdown(
         id='year-dropdown',
         options=dropdown_options,
-        value=current_year
+        # Neuestes vorberechnetes Jahr, damit die Startansicht aus dem Figuren-Cache kommt
+        value=YEARS[-1]
     )
     return dropdown
 
-min_date, max_date = get_order_date_range(cursor)
+def load_order_date_range():
+    with db.cursor() as cursor:
+        return get_order_date_range(cursor)
+
+# Stundenprognose für die Personalplanung, gleiche Zeitverschiebung wie ORDERS_QUERY
+forecaster = StoreForecaster(db, horizon_days=7, time_shift='9 hours')
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# Live-Zähler für heute, gleiche Zeitverschiebung wie ORDERS_QUERY
+live_counters = LiveCounters(db, time_shift_hours=9)
+# Abfrageintervall des Live-Diagramms in Millisekunden
+LIVE_INTERVAL_MS = 5000
+
+def build_hourly_forecast_figure():
+    expected = forecaster.hourly_forecast(days=7)
+    if not expected.any():
+        return px.imshow([[0]])
+    fig = px.imshow(expected.round(1), x=list(range(24)), y=WEEKDAYS, aspect='auto',
+                    color_continuous_scale='Viridis',
+                    labels={'x': 'Hour', 'y': 'Weekday', 'color': 'Expected orders'})
+    fig.update_layout(title='Expected orders per hour, next 7 days')
+    return fig
+
+# Keine Datenbankarbeit beim Import: der Datumsbereich wird im Hintergrund vorgeladen
+warmup.register('pizza.date_range', load_order_date_range)
+warmup.register('pizza.forecast', forecaster.refresh)
 
 dash.register_page(__name__, path='/pizza', name='Pizza Dashboard', title='Pizza Dashboard')
 
-layout = dbc.Container([
-    html.Div(className='container', children=[
-        html.Div(className='row', children=[
-            html.Div(className='col-6', children=[
-                html.Div(className='analysis-container', children=[
-                    html.Div(className='h2-container', children=[
-                        html.H2("Order Dates")
-                    ]),
-                    html.Label("Choose a period:"),
-                    html.Div(className='datePicker', children=[
-                        dcc.DatePickerRange(
-                            id='date-picker-range',
-                            start_date=min_date,
-                            end_date=max_date,
-                            display_format='YYYY-MM-DD',
-                            persistence=True,
-                            persistence_type='session'
-                        )
+def layout():
+    min_date, max_date = warmup.get('pizza.date_range', (None, None), timeout=5)
+
+    return dbc.Container([
+        html.Div(className='container', children=[
+            html.Div(className='row', children=[
+                html.Div(className='col-6', children=[
+                    html.Div(className='analysis-container', children=[
+                        html.Div(className='h2-container', children=[
+                            html.H2("Order Dates")
+                        ]),
+                        html.Label("Choose a period:"),
+                        html.Div(className='datePicker', children=[
+                            dcc.DatePickerRange(
+                                id='date-picker-range',
+                                start_date=min_date,
+                                end_date=max_date,
+                                display_format='YYYY-MM-DD',
+                                persistence=True,
+                                persistence_type='session'
+                            )
+                        ]),
+                        dcc.Graph(id='order-time-graph'),
+                        # Zeitraum einer angezeigten Schätzung, das exakte Ergebnis folgt
+                        dcc.Store(id='order-time-preview'),
+                        html.A('Export CSV', id='orders-export-csv', href='#', className='me-3'),
+                        html.A('Export Parquet', id='orders-export-parquet', href='#'),
+                        # Aus den zwischengespeicherten Modellen, ohne Abfrage beim Seitenaufruf
+                        dcc.Graph(id='hourly-forecast-graph', figure=build_hourly_forecast_figure()),
+                        dbc.Checklist(options=[{'label': 'Live (today)', 'value': 'live'}], value=[],
+                                      id='pizza-live-toggle', switch=True),
+                        dcc.Interval(id='pizza-live-interval', interval=LIVE_INTERVAL_MS, disabled=True),
+                        dcc.Store(id='pizza-live-version'),
+                        dcc.Graph(id='pizza-live-graph'),
                     ]),
-                    dcc.Graph(id='order-time-graph'),
                 ]),
-            ]),
-            html.Div(className='col-6', children=[
-                html.Div(className='analysis-container', children=[
-                    html.Div(className='h2-container', children=[
-                        html.H2("Location Analysis")
-                    ]),
-                    create_year_dropdown(),
-                    html.Div(className='row', children=[
-                        html.Div(className='col-6', children=[
-                            dcc.Graph(id='choropleth-map', style={'height': '300px', 'width': '100%'})
+                html.Div(className='col-6', children=[
+                    html.Div(className='analysis-container', children=[
+                        html.Div(className='h2-container', children=[
+                            html.H2("Location Analysis")
                         ]),
-                        html.Div(className='col-6', children=[
-                            dcc.Graph(id='bar-chart', style={'height': '300px', 'width': '100%'})
+                        create_year_dropdown(),
+                        html.Div(className='row', children=[
+                            html.Div(className='col-6', children=[
+                                dcc.Graph(id='choropleth-map', style={'height': '300px', 'width': '100%'})
+                            ]),
+                            html.Div(className='col-6', children=[
+                                dcc.Graph(id='bar-chart', style={'height': '300px', 'width': '100%'})
+                            ])
                         ])
-                    ])
+                    ]),
                 ]),
             ]),
         ]),
+        # Tab-ID für den Abbruch überholter Abfragen (cancellation.py)
+        tab_store(),
     ])
-])
+
+def build_order_time_figure(order_counts, title='Orders per hour', error_y=None):
+    fig = px.bar(order_counts, x='orderdate', y='count', error_y=error_y,
+                 labels={'orderdate': 'Hour', 'count': 'Number of orders'})
+    fig.update_layout(title=title,
+                      xaxis_title='Time',
+                      yaxis_title='Number of orders')
+    return fig
+
+def build_exact_order_time_figure(start_date, end_date):
+    order_counts = count_orders_per_hour(start_date, end_date)
+    if order_counts.empty or order_counts['count'].sum() == 0:
+        return px.bar()
+    return build_order_time_figure(order_counts)
 
 @dash.callback(
     Output('order-time-graph', 'figure'),
+    Output('order-time-preview', 'data'),
     [Input('date-picker-range', 'start_date'),
-     Input('date-picker-range', 'end_date')]
+     Input('date-picker-range', 'end_date')],
+    State(TAB_STORE, 'data')
 )
+@cancellable
 def update_graph(start_date, end_date):
-    df = fetch_orders(cursor, start_date, end_date)
-    if df.empty:
-        return px.bar()
+    # Große Zeiträume: zuerst die Schätzung anzeigen, update_graph_exact ersetzt sie.
+    # order-time-preview wird immer geschrieben, damit ein noch laufender exakter Aufruf abgelöst wird
+    if sampling.needs_preview(start_date, end_date):
+        estimate = estimate_orders_per_hour(start_date, end_date)
+        if not estimate.empty and estimate['count'].sum() > 0:
+            title = (f"Orders per hour (estimate from a {sampling.PREVIEW_SAMPLE_PERCENT:g}% sample, "
+                     f"95% interval, loading exact values...)")
+            return (build_order_time_figure(estimate, title, error_y='margin'),
+                    {'start_date': start_date, 'end_date': end_date})
+    return build_exact_order_time_figure(start_date, end_date), None
 
-    order_counts = df.groupby(df['orderdate'].dt.hour).size().reset_index(name='count')
-    fig = px.bar(order_counts, x='orderdate', y='count',
-                 labels={'orderdate': 'Hour', 'count': 'Number of orders'})
-    fig.update_layout(title='Orders per hour',
-                      xaxis_title='Time',
-                      yaxis_title='Number of orders')
+@dash.callback(
+    Output('order-time-graph', 'figure', allow_duplicate=True),
+    Input('order-time-preview', 'data'),
+    State(TAB_STORE, 'data'),
+    prevent_initial_call=True
+)
+@cancellable
+def update_graph_exact(preview):
+    if not preview:
+        raise PreventUpdate
+    return build_exact_order_time_figure(preview['start_date'], preview['end_date'])
+
+def hourly_totals(counts):
+    totals = [0] * 24
+    for (_, hour), count in counts.items():
+        totals[hour] += count
+    return totals
+
+def build_live_figure(counts):
+    fig = px.bar(x=list(range(24)), y=hourly_totals(counts),
+                 labels={'x': 'Hour', 'y': 'Number of orders'})
+    fig.update_layout(title='Orders per hour today (live)')
     return fig
 
+dash.clientside_callback(
+    ClientsideFunction(namespace='live', function_name='toggleInterval'),
+    Output('pizza-live-interval', 'disabled'),
+    Input('pizza-live-toggle', 'value')
+)
+
 @dash.callback(
-    [Output('choropleth-map', 'figure'),
-     Output('bar-chart', 'figure')],
-    [Input('year-dropdown', 'value')]
+    Output('pizza-live-graph', 'figure'),
+    Output('pizza-live-version', 'data'),
+    Input('pizza-live-interval', 'n_intervals'),
+    Input('pizza-live-toggle', 'value'),
+    State('pizza-live-version', 'data'),
+    prevent_initial_call=True
 )
-def update_maps_and_chart(selected_year):
-    store_data = get_store_data(cursor, selected_year)
+def update_live_graph(n_intervals, live, version):
+    if not live:
+        raise PreventUpdate
+    version, changes = live_counters.changes_since(version)
+    if changes is None:
+        version, counts = live_counters.snapshot()
+        return build_live_figure(counts), version
+    if not changes:
+        raise PreventUpdate
+    # Nur die geänderten Stunden übertragen, als absolute Werte (eine doppelte Zustellung schadet nicht)
+    hours = {hour for _, hour in changes}
+    totals = hourly_totals(live_counters.snapshot()[1])
+    patched = Patch()
+    for hour in hours:
+        patched['data'][0]['y'][hour] = totals[hour]
+    return patched, version
+
+def orders_export(args):
+    # Die einzelnen Bestellungen hinter "Orders per hour"
+    return ORDERS_QUERY, (args['start_date'], args['end_date']), ["orderid", "orderdate"]
+
+exports.register('orders', db, orders_export)
+
+dash.clientside_callback(
+    ClientsideFunction(namespace='exports', function_name='orders'),
+    Output('orders-export-csv', 'href'),
+    Output('orders-export-parquet', 'href'),
+    Input('date-picker-range', 'start_date'),
+    Input('date-picker-range', 'end_date')
+)
+
+def build_maps_and_chart(selected_year):
+    with db.cursor() as cursor:
+        store_data = get_store_data(cursor, selected_year)
     top_stores = store_data.nlargest(3, "Order Count").reset_index(drop=True)
     predefined_colors = ['#EF553B', '#EF553B', '#EF553B']
     top_stores['Color'] = predefined_colors
@@ -180,3 +333,17 @@ def update_maps_and_chart(selected_year):
                      title="Top 3 stores with most sold products")
 
     return fig, bar_fig
+
+# Karte und Balkendiagramm pro Jahr werden beim Warmup vorberechnet
+maps_and_chart_cache = FigureCache('pizza.maps_and_chart', build_maps_and_chart,
+                                   keys=lambda: [(year,) for year in YEARS],
+                                   version=db.data_version)
+warmup.register('pizza.maps_and_chart', maps_and_chart_cache.precompute)
+
+@dash.callback(
+    [Output('choropleth-map', 'figure'),
+     Output('bar-chart', 'figure')],
+    [Input('year-dropdown', 'value')]
+)
+def update_maps_and_chart(selected_year):
+    return maps_and_chart_cache.get(selected_year)
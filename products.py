@@ -0,0 +1,163 @@
+import threading
+import time
+
+import dash
+from dash import html, dcc, callback, Input, Output
+import dash_bootstrap_components as dbc
+from lazy_imports import lazy_import
+import pandas as pd
+from copurchase import CoPurchaseIndex, snapshot_version
+from db import Database
+import warmup
+
+dash.register_page(__name__, name='Products', path='/products')
+
+px = lazy_import('plotly.express')
+
+# Verbindungsparameter
+db_host = "localhost"
+db_name = "postgres"
+db_user = "postgres"
+db_password = "password"
+db_port = "5432"
+
+# Verbindung wird erst bei der ersten Abfrage aufgebaut
+db = Database(
+    host=db_host,
+    database=db_name,
+    user=db_user,
+    password=db_password,
+    port=db_port
+)
+
+# Höchstens alle INDEX_REFRESH_SECONDS wird geprüft, ob ingest.py einen neuen Schnappschuss gespeichert hat
+INDEX_REFRESH_SECONDS = 60
+_checked_at = {'time': 0.0}
+
+
+def get_products():
+    try:
+        sql_query = """
+                    SELECT sku, name, size, category, price
+                    FROM products
+                    ORDER BY name, size;
+                    """
+        with db.cursor() as cursor:
+            cursor.execute(sql_query)
+            results = cursor.fetchall()
+        return pd.DataFrame(results, columns=["SKU", "Name", "Size", "Category", "Price"])
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Produktdaten: {e}")
+        return pd.DataFrame(columns=["SKU", "Name", "Size", "Category", "Price"])
+
+
+def get_stores():
+    try:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT storeid, city FROM stores ORDER BY city, storeid;")
+            results = cursor.fetchall()
+        return pd.DataFrame(results, columns=["Store ID", "City"])
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Store-Daten: {e}")
+        return pd.DataFrame(columns=["Store ID", "City"])
+
+
+def load_copurchase_index():
+    # Nur den Schnappschuss von ingest.py laden; die Worker lesen selbst keine Bestellungen
+    index = CoPurchaseIndex.load()
+    if index.version is None:
+        print("Kein Co-Purchase-Index gefunden, zuerst 'python ingest.py copurchase' ausführen")
+    return index
+
+
+def get_copurchase_index():
+    index = warmup.require('products.copurchase')
+    if time.monotonic() - _checked_at['time'] >= INDEX_REFRESH_SECONDS:
+        _checked_at['time'] = time.monotonic()
+        if snapshot_version() != index.version:
+            # Neuer Schnappschuss: im Hintergrund laden, bis dahin antwortet der bisherige Index
+            threading.Thread(target=warmup.refresh, args=('products.copurchase',), daemon=True).start()
+    return index
+
+
+# Keine Datenbankarbeit beim Import: Produkte und Index werden im Hintergrund vorgeladen
+warmup.register('products.products', get_products)
+warmup.register('products.stores', get_stores)
+warmup.register('products.copurchase', load_copurchase_index)
+
+
+def product_label(product):
+    return f"{product.Name} ({product.Size})" if product.Size else product.Name
+
+
+def layout():
+    products = warmup.get('products.products', pd.DataFrame(columns=["SKU", "Name", "Size"]), timeout=5)
+    stores = warmup.get('products.stores', pd.DataFrame(columns=["Store ID", "City"]), timeout=5)
+
+    product_options = [{'label': product_label(product), 'value': product.SKU}
+                       for product in products.itertuples(index=False)]
+    store_options = [{'label': f"{store.City} ({store[0]})", 'value': store[0]}
+                     for store in stores.itertuples(index=False)]
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([html.H3('Frequently Bought Together')], width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Dropdown(id='product-dropdown', options=product_options,
+                             value=product_options[0]['value'] if product_options else None,
+                             placeholder="Wählen Sie ein Produkt")
+            ], width=5),
+            dbc.Col([
+                dcc.Dropdown(id='product-store-dropdown', options=store_options,
+                             placeholder="Alle Stores")
+            ], width=5),
+            dbc.Col([
+                dbc.Input(id='product-top-count', type='number', min=1, max=30, step=1, value=10),
+            ], width=2),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='copurchase-bar-chart')
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                html.Div(id='copurchase-summary', style={'margin-top': '20px'})
+            ], width=12),
+        ]),
+    ], className='container')
+
+
+@callback(
+    Output('copurchase-bar-chart', 'figure'),
+    Output('copurchase-summary', 'children'),
+    Input('product-dropdown', 'value'),
+    Input('product-store-dropdown', 'value'),
+    Input('product-top-count', 'value')
+)
+def update_copurchase(sku, store_id, top_n):
+    if sku is None:
+        return px.bar(), []
+
+    index = get_copurchase_index()
+    top = index.top_k(sku, int(top_n or 10), store_id)
+    if top.empty:
+        return px.bar(), [html.P("No data available.")]
+
+    products = warmup.require('products.products')
+    labels = {product.SKU: product_label(product) for product in products.itertuples(index=False)}
+    top['Product'] = top['sku'].map(labels).fillna(top['sku'])
+
+    fig = px.bar(top, x='Product', y='orders', hover_data={'confidence': ':.1%', 'lift': ':.2f'},
+                 labels={'orders': 'Orders containing both', 'Product': 'Product'})
+    fig.update_layout(title=f"Bought together with {labels.get(sku, sku)}")
+
+    best = top.iloc[0]
+    summary = [
+        html.P(f"{best['confidence']:.1%} of orders with this product also contain {best['Product']}"
+               f" (lift {best['lift']:.2f})."),
+        html.P(f"Based on {index.order_counts.get(store_id, 0) if store_id else index.orders} orders."),
+    ]
+    return fig, summary
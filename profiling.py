@@ -0,0 +1,218 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+
+from flask import Response, abort, g, jsonify, request
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pyinstrument ist optional, sonst wird cProfile verwendet
+    Profiler = None
+
+# Profiling ist opt-in: DASH_PROFILING=1 aktiviert die Hooks, DASH_PROFILING_TOKEN ist dann Pflicht
+PROFILE_HEADER = 'X-Profile-Callbacks'
+PROFILE_ARG = 'profile'
+TOKEN_HEADER = 'X-Profile-Token'
+DASH_UPDATE_PATH = '/_dash-update-component'
+MAX_REPORTS = 20
+MAX_ARMED = 50
+
+_lock = threading.Lock()
+_remaining = 0
+_active = 0
+# Zählt gestartete Messungen, um überlappende Messungen im Bericht zu kennzeichnen
+_started = 0
+_reports = OrderedDict()
+
+
+def _authorized():
+    token = os.environ.get('DASH_PROFILING_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get(TOKEN_HEADER, ''), token)
+
+
+def _requested_count():
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_ARG)
+    if not value:
+        return 0
+    try:
+        return max(0, min(int(value), MAX_ARMED))
+    except ValueError:
+        return 0
+
+
+def arm(count):
+    global _remaining
+    with _lock:
+        _remaining = max(0, min(count, MAX_ARMED))
+        return _remaining
+
+
+def _take_slot():
+    global _remaining, _active, _started
+    with _lock:
+        if _remaining <= 0:
+            return None
+        _remaining -= 1
+        _active += 1
+        _started += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        elif _active == 1:
+            tracemalloc.reset_peak()
+        return _started, _active == 1
+
+
+def _release_slot():
+    global _active
+    with _lock:
+        overlapping = _started != g.profile_slot[0] or not g.profile_slot[1]
+        _active -= 1
+        if _active == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return overlapping
+
+
+def _callback_name():
+    body = request.get_json(silent=True) or {}
+    return body.get('output', 'unknown')
+
+
+def _before_request():
+    if not _authorized():
+        return
+    count = _requested_count()
+    if count:
+        arm(count)
+    if request.path != DASH_UPDATE_PATH:
+        return
+    slot = _take_slot()
+    if slot is None:
+        return
+
+    g.profile_slot = slot
+    g.profile_started = time.perf_counter()
+    g.profile_callback = _callback_name()
+    g.profile_snapshot = tracemalloc.take_snapshot()
+    if Profiler is not None:
+        g.profiler = Profiler(async_mode='disabled')
+        g.profiler.start()
+    else:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+
+    try:
+        if Profiler is not None:
+            profiler.stop()
+        else:
+            profiler.disable()
+        duration = time.perf_counter() - g.profile_started
+        current, peak = tracemalloc.get_traced_memory()
+        allocations = tracemalloc.take_snapshot().compare_to(g.profile_snapshot, 'lineno')[:15]
+    finally:
+        overlapping = _release_slot()
+
+    report_id = uuid.uuid4().hex[:12]
+    report = {
+        'id': report_id,
+        'callback': g.profile_callback,
+        'duration_ms': round(duration * 1000, 2),
+        # tracemalloc misst prozessweit: der Peak enthält alles, was andere Threads währenddessen belegen
+        'process_peak_memory_kb': round(peak / 1024, 1),
+        'overlapping': overlapping,
+        'allocations': [str(stat) for stat in allocations],
+        'profiler': profiler,
+        'created': time.time(),
+    }
+    with _lock:
+        _reports[report_id] = report
+        while len(_reports) > MAX_REPORTS:
+            _reports.popitem(last=False)
+
+    response.headers['X-Profile-Report'] = f'/_profile/{report_id}'
+    return response
+
+
+def _render_text(report):
+    out = io.StringIO()
+    out.write(f"Callback: {report['callback']}\n")
+    out.write(f"Dauer: {report['duration_ms']} ms, Peak-Speicher (Prozess): {report['process_peak_memory_kb']} KB")
+    if report['overlapping']:
+        out.write(" - andere Messungen liefen gleichzeitig, Speicherwerte nicht zuverlässig")
+    out.write("\n\n")
+    profiler = report['profiler']
+    if Profiler is not None:
+        out.write(profiler.output_text(unicode=True, color=False))
+    else:
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+    out.write('\nTop-Allokationen (tracemalloc):\n')
+    out.write('\n'.join(report['allocations']))
+    return out.getvalue()
+
+
+def _list_reports():
+    if not _authorized():
+        abort(403)
+    with _lock:
+        reports = [{key: value for key, value in report.items() if key != 'profiler'}
+                   for report in _reports.values()]
+    return jsonify(armed=_remaining, reports=reports)
+
+
+def _get_report(report_id):
+    if not _authorized():
+        abort(403)
+    report = _reports.get(report_id)
+    if report is None:
+        abort(404)
+
+    fmt = request.args.get('format', 'html' if Profiler is not None else 'txt')
+    profiler = report['profiler']
+    filename = f"profile-{report_id}"
+    if fmt == 'html' and Profiler is not None:
+        return Response(profiler.output_html(), mimetype='text/html',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.html'})
+    if fmt == 'speedscope' and Profiler is not None:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        return Response(profiler.output(SpeedscopeRenderer()), mimetype='application/json',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.speedscope.json'})
+    if fmt == 'pstats' and Profiler is None:
+        # Binärer pstats-Dump, z.B. für snakeviz oder flameprof
+        path = os.path.join(os.environ.get('TMPDIR', '/tmp'), f'{filename}.pstats')
+        profiler.dump_stats(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.remove(path)
+        return Response(data, mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.pstats'})
+    return Response(_render_text(report), mimetype='text/plain')
+
+
+def init_profiling(server, enabled=None):
+    if enabled is None:
+        enabled = os.environ.get('DASH_PROFILING') == '1'
+    if not enabled:
+        return False
+    if not os.environ.get('DASH_PROFILING_TOKEN'):
+        print("Fehler beim Aktivieren des Profilings: DASH_PROFILING_TOKEN ist nicht gesetzt")
+        return False
+
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.add_url_rule('/_profile/', 'profile_list', _list_reports)
+    server.add_url_rule('/_profile/<report_id>', 'profile_report', _get_report)
+    return True
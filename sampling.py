@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+
+# Vorschau für große Zeiträume: zuerst eine Schätzung aus einer Blockstichprobe (TABLESAMPLE SYSTEM),
+# danach das exakte Ergebnis. SYSTEM wählt jede Seite unabhängig mit Wahrscheinlichkeit f, die Schätzung
+# ist daher Summe/f über die gezogenen Seiten (Horvitz-Thompson) mit der Varianz (1-f)/f² · Σ Seitensumme².
+# Gruppiert wird deshalb erst pro Seite: Bestellungen einer Seite liegen zeitlich nah beieinander und
+# dürfen nicht als unabhängige Zeilen gezählt werden.
+
+PREVIEW_SAMPLE_PERCENT = float(os.environ.get('PREVIEW_SAMPLE_PERCENT', 2))
+# Ab dieser Länge des Zeitraums (Tage) wird zuerst geschätzt
+PREVIEW_MIN_DAYS = int(os.environ.get('PREVIEW_MIN_DAYS', 180))
+# 95%-Intervall
+Z_95 = 1.96
+
+
+def needs_preview(start_date, end_date):
+    if not start_date or not end_date:
+        return False
+    return (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days >= PREVIEW_MIN_DAYS
+
+
+def tablesample(percent=PREVIEW_SAMPLE_PERCENT):
+    return f"TABLESAMPLE SYSTEM ({float(percent)})"
+
+
+def page_columns():
+    # Seite der Zeile; tableoid unterscheidet gleiche Seitennummern verschiedener Partitionen
+    return "tableoid AS sample_table, (ctid::text::point)[0] AS sample_page"
+
+
+def estimate_query(rows_query, group_columns, percent=PREVIEW_SAMPLE_PERCENT):
+    # rows_query: Abfrage über "orders TABLESAMPLE ..." mit den Gruppenspalten, einer Spalte value
+    # (1 zum Zählen) und page_columns() -> Gruppen mit estimate und stderr
+    fraction = float(percent) / 100
+    groups = ', '.join(group_columns)
+    return f"""
+        SELECT {groups}, SUM(value) / {fraction} AS estimate,
+               SQRT({1 - fraction} * SUM(value * value)) / {fraction} AS stderr
+        FROM (
+            SELECT {groups}, SUM(value) AS value
+            FROM ({rows_query}) sampled_rows
+            GROUP BY {groups}, sample_table, sample_page
+        ) sampled_pages
+        GROUP BY {groups}
+        ORDER BY {groups}
+    """
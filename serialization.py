@@ -0,0 +1,137 @@
+import base64
+import threading
+import time
+
+import numpy as np
+import plotly.io as pio
+from flask import g, jsonify, request
+
+try:
+    import orjson
+except ImportError:  # ohne orjson bleibt der Standard-Encoder von plotly
+    orjson = None
+
+try:
+    from flask_compress import Compress
+except ImportError:  # ohne flask-compress werden Antworten unkomprimiert gesendet
+    Compress = None
+
+# Schnellere und kleinere Callback-Antworten:
+# - orjson (mit NumPy-Unterstützung) als JSON-Encoder für Figuren, auch für Dash selbst
+# - große numerische Arrays als base64-kodierte Typed Arrays ({dtype, bdata}) statt Zahlenlisten
+# - gzip/brotli-Kompression der Antworten
+# Pro Callback werden Bytes vor und nach der Kompression sowie die Antwortzeit unter /_serialization erfasst.
+
+# Kürzere Arrays bleiben Listen, dort lohnt die Kodierung nicht
+TYPED_ARRAY_MIN_LENGTH = 1000
+
+_TYPED_ARRAY_DTYPES = {
+    np.dtype('float64'): 'f8', np.dtype('float32'): 'f4',
+    np.dtype('int32'): 'i4', np.dtype('uint32'): 'u4',
+    np.dtype('int16'): 'i2', np.dtype('uint16'): 'u2',
+    np.dtype('int8'): 'i1', np.dtype('uint8'): 'u1',
+}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _typed_array(values):
+    if values.dtype not in _TYPED_ARRAY_DTYPES:
+        # plotly.js kennt keine 64-Bit-Ganzzahlen
+        if values.dtype.kind in 'iu' and values.size and np.abs(values).max() < 2 ** 31:
+            values = values.astype(np.int32)
+        else:
+            values = values.astype(np.float64)
+    encoded = {'dtype': _TYPED_ARRAY_DTYPES[values.dtype],
+               'bdata': base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')}
+    if values.ndim > 1:
+        encoded['shape'] = ','.join(str(n) for n in values.shape)
+    return encoded
+
+
+def encode_typed_arrays(obj):
+    if isinstance(obj, dict):
+        return {key: encode_typed_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_typed_arrays(value) for value in obj]
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in 'iuf' and obj.size >= TYPED_ARRAY_MIN_LENGTH:
+        return _typed_array(obj)
+    return obj
+
+
+def figure_to_json(fig):
+    # fig.to_dict() behält die NumPy-Arrays der Spuren, die dann direkt als Bytes kodiert werden
+    data = fig.to_dict() if hasattr(fig, 'to_dict') else fig
+    data = {'data': encode_typed_arrays(data.get('data', [])), 'layout': data.get('layout', {})}
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass  # z.B. Objekt-Arrays mit Timestamps, die nur der plotly-Encoder kennt
+    return pio.to_json(data, validate=False)
+
+
+def _callback_name():
+    try:
+        return (request.get_json(silent=True) or {}).get('output', 'unknown')
+    except Exception:
+        return 'unknown'
+
+
+def _record(name, raw_bytes, wire_bytes, duration):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'calls': 0, 'raw_bytes': 0, 'wire_bytes': 0, 'seconds': 0.0})
+        entry['calls'] += 1
+        entry['raw_bytes'] += raw_bytes
+        entry['wire_bytes'] += wire_bytes
+        entry['seconds'] += duration
+
+
+def stats():
+    with _stats_lock:
+        return {name: {'calls': entry['calls'],
+                       'avg_raw_bytes': entry['raw_bytes'] // entry['calls'],
+                       'avg_wire_bytes': entry['wire_bytes'] // entry['calls'],
+                       'avg_ms': round(1000 * entry['seconds'] / entry['calls'], 1)}
+                for name, entry in sorted(_stats.items())}
+
+
+def init_serialization(server):
+    if orjson is not None:
+        # Dash serialisiert Callback-Antworten über plotly.io.json, also gilt das auch dort
+        pio.json.config.default_engine = 'orjson'
+
+    # after_request-Funktionen laufen in umgekehrter Reihenfolge: dieser Hook sieht die komprimierte Antwort
+    @server.after_request
+    def record_wire_size(response):
+        if request.path.endswith('/_dash-update-component') and 'serialization_started' in g:
+            wire_bytes = response.calculate_content_length() or 0
+            _record(_callback_name(), g.get('serialization_raw_bytes', wire_bytes), wire_bytes,
+                    time.perf_counter() - g.serialization_started)
+        return response
+
+    if Compress is not None:
+        server.config.setdefault('COMPRESS_ALGORITHM', ['br', 'gzip'])
+        server.config.setdefault('COMPRESS_MIMETYPES', ['application/json', 'text/html', 'text/css',
+                                                        'application/javascript', 'text/csv'])
+        server.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        # Gestreamte Antworten (Exporte) nicht puffern
+        server.config.setdefault('COMPRESS_STREAMS', False)
+        Compress(server)
+    else:
+        print("flask-compress nicht installiert, Antworten werden unkomprimiert gesendet")
+
+    @server.before_request
+    def start_timer():
+        if request.path.endswith('/_dash-update-component'):
+            g.serialization_started = time.perf_counter()
+
+    # ...und dieser Hook (zuletzt registriert, läuft zuerst) die unkomprimierte
+    @server.after_request
+    def record_raw_size(response):
+        if request.path.endswith('/_dash-update-component') and not response.is_streamed:
+            g.serialization_raw_bytes = response.calculate_content_length() or 0
+        return response
+
+    server.add_url_rule('/_serialization', 'serialization_stats', lambda: jsonify(stats()))
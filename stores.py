@@ -1,14 +1,24 @@
 import dash
-from dash import html, dcc, callback, Input, Output, callback_context
+from dash import html, dcc, callback, clientside_callback, ClientsideFunction, Input, Output, State, Patch
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.express as px
+from lazy_imports import lazy_import
 import pandas as pd
-import psycopg2 as pg
-from geopy.distance import geodesic
-from functools import lru_cache
+from functools import lru_cache, partial
+from db import Database, run_concurrently
+from cancellation import cancellable, tab_store, QueryCancelled, QueryTimeout, TAB_STORE
+import exports
+from catchment import get_catchment_summary, get_distance_distribution
+from forecasting import StoreForecaster
+from live import LiveCounters
+from sketches import distinct_customers, exact_distinct_customers, HLL_ERROR
+from figure_cache import FigureCache
+import warmup
 
 dash.register_page(__name__, name='Stores', path='/stores')
 
+px = lazy_import('plotly.express')
+
 # Verbindungsparameter
 db_host = "localhost"
 db_name = "postgres"
@@ -16,8 +26,8 @@ db_user = "postgres"
 db_password = "password"
 db_port = "5432"
 
-# Verbindung zur Datenbank herstellen
-connection = pg.connect(
+# Verbindung wird erst bei der ersten Abfrage aufgebaut
+db = Database(
     host=db_host,
     database=db_name,
     user=db_user,
@@ -25,22 +35,50 @@ connection = pg.connect(
     port=db_port
 )
 
-cursor = connection.cursor()
+
+# Ohne Tagesskizzen (python ingest.py sketches noch nicht gelaufen) wird exakt aus den Bestellungen gezählt
+STORE_DATA_EXACT_QUERY = """
+                         SELECT s.storeid, s.latitude, s.longitude, s.city, COUNT(o.orderid) as order_count,
+                                COUNT(DISTINCT o.customerid) as customer_count
+                         FROM stores s
+                         LEFT JOIN orders o ON s.storeid = o.storeid
+                         GROUP BY s.storeid, s.latitude, s.longitude, s.city;
+                         """
+
+
+def has_sketches(cursor):
+    cursor.execute("SELECT to_regclass('store_day_sketches') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return False
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM store_day_sketches);")
+    return cursor.fetchone()[0]
 
 
 @lru_cache(maxsize=32)
 def get_store_data():
     try:
-        sql_query = """
-                    SELECT s.storeid, s.latitude, s.longitude, s.city, COUNT(o.orderid) as order_count, COUNT(DISTINCT o.customerid) as customer_count
-                    FROM stores s
-                    LEFT JOIN orders o ON s.storeid = o.storeid
-                    GROUP BY s.storeid, s.latitude, s.longitude, s.city;
-                    """
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-        return pd.DataFrame(results,
-                            columns=["Store ID", "Latitude", "Longitude", "City", "Order Count", "Customer Count"])
+        with db.cursor() as cursor:
+            if not has_sketches(cursor):
+                print("Keine Tagesskizzen in store_day_sketches, Store-Karte wird exakt gezählt "
+                      "(python ingest.py sketches ausführen)")
+                cursor.execute(STORE_DATA_EXACT_QUERY)
+                return pd.DataFrame(cursor.fetchall(), columns=["Store ID", "Latitude", "Longitude", "City",
+                                                                "Order Count", "Customer Count"])
+            sql_query = """
+                        SELECT s.storeid, s.latitude, s.longitude, s.city, COALESCE(SUM(d.orders), 0) as order_count
+                        FROM stores s
+                        LEFT JOIN store_day_sketches d ON s.storeid = d.storeid
+                        GROUP BY s.storeid, s.latitude, s.longitude, s.city;
+                        """
+            cursor.execute(sql_query)
+            results = cursor.fetchall()
+            store_data = pd.DataFrame(results, columns=["Store ID", "Latitude", "Longitude", "City", "Order Count"])
+            # Eindeutige Kunden über den gesamten Zeitraum aus den zusammengeführten Tagesskizzen
+            customers = distinct_customers(cursor, {store_id: [store_id] for store_id in store_data['Store ID']},
+                                           '-infinity', 'infinity', granularities=('total',))['total']
+        store_data['Customer Count'] = [customers.get(store_id, {}).get('total', 0)
+                                        for store_id in store_data['Store ID']]
+        return store_data
     except Exception as e:
         print(f"Fehler beim Abrufen der Store-Daten: {e}")
         return pd.DataFrame()
@@ -51,49 +89,96 @@ def get_sales_data(store_ids, start_date, end_date):
     try:
         store_ids_str = ', '.join(f"'{store_id}'" for store_id in store_ids)  # Convert list to comma-separated string
         sql_query = f"""
-                    SELECT o.storeid, s.city, DATE(o.orderdate) as order_date, COUNT(oi.orderid) as sales_count, 
-                    COUNT(DISTINCT o.customerid) as customer_count, SUM(p.price) as total_revenue
+                    SELECT o.storeid, s.city, DATE(o.orderdate) as order_date, COUNT(oi.orderid) as sales_count,
+                    SUM(p.price) as total_revenue
                     FROM orders o
-                    LEFT JOIN orderitems oi ON o.orderid = oi.orderid
+                    LEFT JOIN orderitems oi ON o.orderid = oi.orderid AND oi.orderdate = o.orderdate
                     LEFT JOIN products p ON oi.sku = p.sku
                     LEFT JOIN stores s ON o.storeid = s.storeid
-                    WHERE o.storeid IN ({store_ids_str}) AND DATE(o.orderdate) BETWEEN %s AND %s
+                    WHERE o.storeid IN ({store_ids_str})
+                    AND o.orderdate >= %s::date AND o.orderdate < %s::date + 1
                     GROUP BY o.storeid, s.city, order_date
                     ORDER BY order_date;
                     """
-        cursor.execute(sql_query, (start_date, end_date))
-        results = cursor.fetchall()
-        sales_data = pd.DataFrame(results, columns=["Store ID", "City", "Order Date", "Sales Count", "Customer Count",
-                                                    "Total Revenue"])
+        with db.cursor() as cursor:
+            cursor.execute(sql_query, (start_date, end_date))
+            results = cursor.fetchall()
+        sales_data = pd.DataFrame(results, columns=["Store ID", "City", "Order Date", "Sales Count", "Total Revenue"])
         return sales_data
+    except (QueryCancelled, QueryTimeout):
+        # Abgebrochen (neuerer Aufruf) oder Zeitlimit erreicht: nicht als leeres Ergebnis zwischenspeichern
+        raise
     except Exception as e:
         print(f"Fehler beim Abrufen der Verkaufsdaten: {e}")
         return pd.DataFrame()
 
 
+# Bis zu dieser Länge des Zeitraums wird exakt gezählt, darüber aus den HLL-Skizzen geschätzt
+EXACT_MAX_DAYS = 31
+
+
 @lru_cache(maxsize=32)
-def get_top_pizzas(store_ids, start_date, end_date):
+def get_customer_counts(store_cities, start_date, end_date):
+    # store_cities: ((Store ID, Stadt), ...) -> eindeutige Kunden pro Stadt und Tag/Woche/Monat
+    store_groups = {}
+    for store_id, city in store_cities:
+        store_groups.setdefault(city, []).append(store_id)
+    days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
     try:
-        store_ids_str = ', '.join(f"'{store_id}'" for store_id in store_ids)  # Convert list to comma-separated string
-        sql_query = f"""
-                    SELECT o.storeid, p.name, COUNT(oi.orderid) as sales_count
-                    FROM orders o
-                    LEFT JOIN orderitems oi ON o.orderid = oi.orderid
-                    LEFT JOIN products p ON oi.sku = p.sku
-                    WHERE o.storeid IN ({store_ids_str}) AND DATE(o.orderdate) BETWEEN %s AND %s
-                    GROUP BY o.storeid, p.name
-                    ORDER BY o.storeid, sales_count DESC;
-                    """
-        cursor.execute(sql_query, (start_date, end_date))
-        results = cursor.fetchall()
-        pizza_data = pd.DataFrame(results, columns=["Store ID", "Pizza Name", "Sales Count"])
+        with db.cursor() as cursor:
+            if days <= EXACT_MAX_DAYS or not has_sketches(cursor):
+                return {'error': 0.0, 'counts': exact_distinct_customers(cursor, store_groups, start_date, end_date)}
+            return {'error': HLL_ERROR, 'counts': distinct_customers(cursor, store_groups, start_date, end_date)}
+    except (QueryCancelled, QueryTimeout):
+        raise
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Kundenzahlen: {e}")
+        return {'error': 0.0, 'counts': {'day': {}, 'week': {}, 'month': {}}}
+
+
+# Erlaubte Ranking-Metriken für die Top-Pizzen (Aggregat; Aliase derselben SELECT-Liste sind im
+# OVER-Ausdruck nicht sichtbar)
+TOP_PIZZA_METRICS = {
+    'count': 'COUNT(oi.orderid)',
+    'revenue': 'SUM(p.price)',
+}
+
+
+def top_pizzas_query(metric='count'):
+    # Parameter: (Store IDs als Tupel, Startdatum, Enddatum, n)
+    rank_expression = TOP_PIZZA_METRICS[metric]
+    return f"""
+            SELECT storeid, name, sales_count, total_revenue
+            FROM (
+                SELECT o.storeid, p.name, COUNT(oi.orderid) as sales_count, SUM(p.price) as total_revenue,
+                       ROW_NUMBER() OVER (PARTITION BY o.storeid
+                                          ORDER BY {rank_expression} DESC, p.name) as rank
+                FROM orders o
+                JOIN orderitems oi ON o.orderid = oi.orderid AND oi.orderdate = o.orderdate
+                JOIN products p ON oi.sku = p.sku
+                WHERE o.storeid IN %s
+                AND o.orderdate >= %s::date AND o.orderdate < %s::date + 1
+                GROUP BY o.storeid, p.name
+            ) ranked
+            WHERE rank <= %s
+            ORDER BY storeid, rank;
+            """
 
-        top_pizzas = pizza_data.groupby('Store ID').apply(lambda x: x.nlargest(3, 'Sales Count')).reset_index(drop=True)
 
-        return top_pizzas
+@lru_cache(maxsize=32)
+def get_top_pizzas(store_ids, start_date, end_date, n=3, metric='count'):
+    try:
+        # Nur die ersten n Zeilen pro Store werden von der Datenbank geliefert
+        sql_query = top_pizzas_query(metric)
+        with db.cursor() as cursor:
+            cursor.execute(sql_query, (tuple(store_ids), start_date, end_date, n))
+            results = cursor.fetchall()
+        return pd.DataFrame(results, columns=["Store ID", "Pizza Name", "Sales Count", "Total Revenue"])
+    except (QueryCancelled, QueryTimeout):
+        raise
     except Exception as e:
         print(f"Fehler beim Abrufen der Pizza-Daten: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=["Store ID", "Pizza Name", "Sales Count", "Total Revenue"])
 
 
 @lru_cache(maxsize=32)
@@ -104,87 +189,206 @@ def get_customer_data():
                     FROM customers
                     LIMIT 1000  -- Limit the number of customers for demonstration purposes
                     """
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
+        with db.cursor() as cursor:
+            cursor.execute(sql_query)
+            results = cursor.fetchall()
         return pd.DataFrame(results, columns=["Customer ID", "Latitude", "Longitude"])
     except Exception as e:
         print(f"Fehler beim Abrufen der Kundendaten: {e}")
         return pd.DataFrame()
 
 
-store_data = get_store_data()
-customer_data = get_customer_data()
+@lru_cache(maxsize=1)
+def get_catchment_data():
+    # Vorberechnet von catchment.py (python ingest.py catchment)
+    try:
+        with db.cursor() as cursor:
+            return get_catchment_summary(cursor)
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Einzugsgebiete: {e}")
+        return pd.DataFrame(columns=["Store ID", "Catchment Customers", "Median Miles", "Median Competitor Gap"])
 
-# Dropdown-Optionen für Stores
-city_options = [{'label': city, 'value': city} for city in store_data['City'].unique()]
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([html.H3('Store Locations')], width=12)
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.DatePickerRange(
-                id='date-picker-range',
-                start_date=pd.to_datetime('2022-01-01'),
-                end_date=pd.to_datetime('2022-12-31'),
-                display_format='YYYY-MM-DD'
-            )
-        ], width=6),
-        dbc.Col([
-            dbc.Checklist(
-                options=[{'label': 'Show Customer Count', 'value': 'show_customers'}],
-                value=['show_customers'],
-                id='show-customer-toggle',
-                switch=True,
-            ),
-        ], width=6),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='store-map')
-        ], width=12),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            html.Div([
-                html.H5("Legend:"),
+@lru_cache(maxsize=32)
+def get_catchment_distribution(store_ids):
+    try:
+        with db.cursor() as cursor:
+            return get_distance_distribution(cursor, store_ids)
+    except (QueryCancelled, QueryTimeout):
+        raise
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Entfernungsverteilung: {e}")
+        return pd.DataFrame(columns=["Store ID", "Bucket", "Customers", "Distance"])
+
+
+# Bestellprognose pro Store für die nächsten vier Wochen
+forecaster = StoreForecaster(db, horizon_days=28)
+
+# Heutige Bestellungen pro Store und Stunde, per LISTEN/NOTIFY aktuell gehalten
+live_counters = LiveCounters(db)
+LIVE_INTERVAL_MS = 5000
+
+# Keine Datenbankarbeit beim Import: die Daten werden im Hintergrund vorgeladen
+warmup.register('stores.store_data', get_store_data)
+warmup.register('stores.customer_data', get_customer_data)
+# Leer, solange ingest.py catchment nicht gelaufen ist
+warmup.register('stores.catchment', get_catchment_data, allow_empty=True)
+warmup.register('stores.forecast', forecaster.refresh)
+
+
+def layout():
+    store_data = warmup.get('stores.store_data', pd.DataFrame(columns=["City"]), timeout=5)
+
+    # Dropdown-Optionen für Stores
+    city_options = [{'label': city, 'value': city} for city in store_data['City'].unique()]
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([html.H3('Store Locations')], width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.DatePickerRange(
+                    id='date-picker-range',
+                    start_date=pd.to_datetime('2022-01-01'),
+                    end_date=pd.to_datetime('2022-12-31'),
+                    display_format='YYYY-MM-DD'
+                )
+            ], width=6),
+            dbc.Col([
+                dbc.Checklist(
+                    options=[{'label': 'Show Customer Count', 'value': 'show_customers'}],
+                    value=['show_customers'],
+                    id='show-customer-toggle',
+                    switch=True,
+                ),
+            ], width=6),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='store-map')
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
                 html.Div([
-                    html.Span("•", style={"font-size": "20px", "color": "#440154FF"}), " Low Order Count",
-                    html.Br(),
-                    html.Span("•", style={"font-size": "20px", "color": "#FDE725FF"}), " High Order Count"
-                ]),
-                html.Div("Point size represents customer count.")
-            ])
-        ], width=12),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.Dropdown(id='city-dropdown', options=city_options, multi=True,
-                         placeholder="Wählen Sie eine oder mehrere Städte")
-        ], width=6),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            html.Div(id='store-sales-info', style={'font-size': '20px', 'margin-top': '20px'})
-        ], width=12),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='sales-bar-chart-orders')
-        ], width=12),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='sales-bar-chart-customers')
-        ], width=12),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            html.Div(id='store-info-boxes', style={'font-size': '20px', 'margin-top': '20px'})
-        ], width=12),
-    ]),
-], className='container')
+                    html.H5("Legend:"),
+                    html.Div([
+                        html.Span("•", style={"font-size": "20px", "color": "#440154FF"}), " Low Order Count",
+                        html.Br(),
+                        html.Span("•", style={"font-size": "20px", "color": "#FDE725FF"}), " High Order Count"
+                    ]),
+                    html.Div("Point size represents customer count.")
+                ])
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Dropdown(id='city-dropdown', options=city_options, multi=True,
+                             placeholder="Wählen Sie eine oder mehrere Städte")
+            ], width=6),
+            dbc.Col([
+                dbc.RadioItems(
+                    options=[{'label': 'Top by Sales', 'value': 'count'},
+                             {'label': 'Top by Revenue', 'value': 'revenue'}],
+                    value='count',
+                    id='top-pizza-metric',
+                    inline=True,
+                ),
+            ], width=4),
+            dbc.Col([
+                dbc.Input(id='top-pizza-count', type='number', min=1, max=20, step=1, value=3, debounce=True),
+            ], width=2),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                html.Div(id='store-sales-info', style={'font-size': '20px', 'margin-top': '20px'})
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.RadioItems(
+                    options=[{'label': 'Day', 'value': 'day'},
+                             {'label': 'Week', 'value': 'week'},
+                             {'label': 'Month', 'value': 'month'}],
+                    value='month',
+                    id='sales-granularity',
+                    inline=True,
+                ),
+            ], width=6),
+            dbc.Col([
+                dbc.Button('Reset Zoom', id='sales-zoom-reset', size='sm', color='secondary'),
+            ], width=6),
+        ]),
+        # Tägliche Verkaufsdaten pro Store; Umgruppieren und Drill-down laufen im Browser
+        dcc.Store(id='store-sales-data'),
+        dcc.Store(id='sales-zoom'),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='sales-bar-chart-orders')
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='sales-bar-chart-customers')
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='catchment-distance-chart')
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Checklist(options=[{'label': 'Live (today)', 'value': 'live'}], value=[],
+                              id='store-live-toggle', switch=True),
+                dcc.Interval(id='store-live-interval', interval=LIVE_INTERVAL_MS, disabled=True),
+                dcc.Store(id='store-live-version'),
+                dcc.Graph(id='store-live-graph')
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                html.A('Export CSV', id='store-sales-export-csv', href='#', className='me-3'),
+                html.A('Export Parquet', id='store-sales-export-parquet', href='#'),
+            ], width=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                html.Div(id='store-info-boxes', style={'font-size': '20px', 'margin-top': '20px'})
+            ], width=12),
+        ]),
+        # Tab-ID für den Abbruch überholter Abfragen (cancellation.py)
+        tab_store(),
+    ], className='container')
+
+
+def build_store_map():
+    store_data = warmup.require('stores.store_data')
+    # Store map
+    map_fig = px.scatter_mapbox(store_data, lat="Latitude", lon="Longitude", hover_name="Store ID",
+                                color="Order Count", size="Customer Count",
+                                color_continuous_scale=px.colors.sequential.Viridis, zoom=3, height=300)
+    map_fig.update_layout(mapbox_style="open-street-map")
+    map_fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
+
+    return map_fig
+
+
+def clear_data_caches():
+    # Neue Bestellungen: zwischengespeicherte Abfragen verwerfen
+    for cached in (get_store_data, get_sales_data, get_customer_counts, get_top_pizzas, get_catchment_data,
+                   get_catchment_distribution):
+        cached.cache_clear()
+    # Sofort neu laden: layout() liest store_data nur per warmup.get, das selbst nie lädt
+    warmup.refresh('stores.store_data')
+    warmup.refresh('stores.catchment')
+
+
+# Die Karte hängt nicht von den Eingaben ab und wird nur bei neuen Daten neu gebaut
+store_map_cache = FigureCache('stores.store_map', build_store_map, keys=lambda: [()],
+                              version=db.data_version, on_invalidate=clear_data_caches)
+warmup.register('stores.store_map', store_map_cache.precompute)
 
 
 @callback(
@@ -194,133 +398,288 @@ layout = dbc.Container([
     Input('show-customer-toggle', 'value')
 )
 def update_store_map(start_date, end_date, show_customers):
-    # Store map
-    map_fig = px.scatter_mapbox(store_data, lat="Latitude", lon="Longitude", hover_name="Store ID",
-                                color="Order Count", size="Customer Count",
-                                color_continuous_scale=px.colors.sequential.Viridis, zoom=3, height=300)
-    map_fig.update_layout(mapbox_style="open-street-map")
-    map_fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
+    return store_map_cache.get()
 
-    return map_fig
+
+def build_sales_series(sales_data):
+    # Kompakte Spaltenform: ein Datumsvektor, pro Store ausgerichtete Zählwerte
+    series = {'dates': [], 'stores': {}}
+    if sales_data.empty:
+        return series
+
+    sales_data = sales_data.assign(**{'Order Date': pd.to_datetime(sales_data['Order Date']).dt.strftime('%Y-%m-%d')})
+    dates = sorted(sales_data['Order Date'].unique())
+    date_index = {date: i for i, date in enumerate(dates)}
+    series['dates'] = dates
+    for (store_id, city), group in sales_data.groupby(['Store ID', 'City']):
+        orders = [0] * len(dates)
+        for date, sales_count in zip(group['Order Date'], group['Sales Count']):
+            orders[date_index[date]] = int(sales_count)
+        series['stores'][store_id] = {'city': city, 'orders': orders}
+    return series
+
+
+@callback(
+    Output('store-sales-data', 'data'),
+    [Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date')],
+    State(TAB_STORE, 'data')
+)
+@cancellable
+def load_store_sales(start_date, end_date):
+    # Einmal pro Datumsbereich für alle Stores laden; Städteauswahl filtert im Browser
+    store_data = warmup.require('stores.store_data')
+    store_ids_tuple = tuple(store_data['Store ID'].tolist())
+    # Umsätze und Kundenzahlen sind die beiden großen, voneinander unabhängigen Abfragen: parallel laden
+    # (im selben Abbruch-Scope). Eindeutige Kunden lassen sich nicht über Tage aufsummieren, daher pro
+    # Granularität vom Server
+    sales_data, customer_counts = run_concurrently(
+        partial(get_sales_data, store_ids_tuple, start_date, end_date),
+        partial(get_customer_counts, tuple(zip(store_data['Store ID'], store_data['City'])), start_date, end_date))
+    series = build_sales_series(sales_data)
+    series['store_cities'] = dict(zip(store_data['Store ID'], store_data['City']))
+    series['customers'] = customer_counts
+    series['forecast'] = build_forecast_series(end_date)
+    return series
+
+
+def build_forecast_series(end_date):
+    # Prognose nur anhängen, wenn der gewählte Zeitraum bis zum Ende der Daten reicht
+    forecast = forecaster.daily_forecast()
+    if forecast.empty or pd.to_datetime(end_date) < forecast['Date'].min() - pd.Timedelta(days=1):
+        return None
+    dates = sorted(forecast['Date'].unique())
+    return {
+        'dates': [pd.Timestamp(date).strftime('%Y-%m-%d') for date in dates],
+        'stores': {store_id: [round(float(value), 1) for value in group.sort_values('Date')['Orders']]
+                   for store_id, group in forecast.groupby('Store ID')},
+    }
+
+
+# Klick auf die Karte fügt die Stadt des Stores zur Auswahl hinzu
+clientside_callback(
+    ClientsideFunction(namespace='stores', function_name='selectCity'),
+    Output('city-dropdown', 'value'),
+    Input('store-map', 'clickData'),
+    State('city-dropdown', 'value'),
+    State('store-sales-data', 'data'),
+    prevent_initial_call=True
+)
+
+# Drill-down: Klick auf einen Monat zoomt auf dessen Tage
+clientside_callback(
+    ClientsideFunction(namespace='stores', function_name='updateZoom'),
+    Output('sales-zoom', 'data'),
+    Input('sales-bar-chart-orders', 'clickData'),
+    Input('sales-bar-chart-customers', 'clickData'),
+    Input('sales-granularity', 'value'),
+    Input('sales-zoom-reset', 'n_clicks'),
+    Input('store-sales-data', 'data'),
+    State('sales-zoom', 'data')
+)
+
+clientside_callback(
+    ClientsideFunction(namespace='stores', function_name='renderSalesCharts'),
+    Output('sales-bar-chart-orders', 'figure'),
+    Output('sales-bar-chart-customers', 'figure'),
+    Input('store-sales-data', 'data'),
+    Input('city-dropdown', 'value'),
+    Input('sales-granularity', 'value'),
+    Input('sales-zoom', 'data')
+)
+
+
+def store_sales_export(args):
+    # Tageswerte pro Store wie in den Verkaufsdiagrammen, optional auf Städte eingeschränkt
+    store_data = warmup.require('stores.store_data')
+    cities = args.getlist('city')
+    if cities:
+        store_data = store_data[store_data['City'].isin(cities)]
+    if store_data.empty:
+        raise ValueError(f"Keine Stores für {cities}")
+    sql_query = """
+                SELECT o.storeid, s.city, DATE(o.orderdate) as order_date, COUNT(oi.orderid) as sales_count,
+                SUM(p.price) as total_revenue
+                FROM orders o
+                LEFT JOIN orderitems oi ON o.orderid = oi.orderid AND oi.orderdate = o.orderdate
+                LEFT JOIN products p ON oi.sku = p.sku
+                LEFT JOIN stores s ON o.storeid = s.storeid
+                WHERE o.storeid IN %s
+                AND o.orderdate >= %s::date AND o.orderdate < %s::date + 1
+                GROUP BY o.storeid, s.city, order_date
+                ORDER BY order_date, o.storeid;
+                """
+    params = (tuple(store_data['Store ID'].tolist()), args['start_date'], args['end_date'])
+    return sql_query, params, ["storeid", "city", "order_date", "sales_count", "total_revenue"]
+
+
+exports.register('store_sales', db, store_sales_export)
+
+clientside_callback(
+    ClientsideFunction(namespace='exports', function_name='storeSales'),
+    Output('store-sales-export-csv', 'href'),
+    Output('store-sales-export-parquet', 'href'),
+    Input('date-picker-range', 'start_date'),
+    Input('date-picker-range', 'end_date'),
+    Input('city-dropdown', 'value')
+)
 
 
 @callback(
-    [Output('city-dropdown', 'value'),
-     Output('sales-bar-chart-orders', 'figure'),
-     Output('sales-bar-chart-customers', 'figure'),
-     Output('store-sales-info', 'children'),
-     Output('store-info-boxes', 'children')],
-    [Input('store-map', 'clickData'),
-     Input('date-picker-range', 'start_date'),
+    Output('catchment-distance-chart', 'figure'),
+    Input('city-dropdown', 'value'),
+    State(TAB_STORE, 'data')
+)
+@cancellable
+def update_catchment_chart(selected_cities):
+    if not selected_cities:
+        return px.bar()
+
+    store_data = warmup.require('stores.store_data')
+    store_ids = tuple(store_data.loc[store_data['City'].isin(selected_cities), 'Store ID'].tolist())
+    distribution = get_catchment_distribution(store_ids)
+    if distribution.empty:
+        return px.bar()
+
+    distribution = distribution.assign(Store=distribution['Store ID'].map(
+        dict(zip(store_data['Store ID'], store_data['City']))) + ' (' + distribution['Store ID'] + ')')
+    fig = px.bar(distribution, x='Distance', y='Customers', color='Store', barmode='group',
+                 labels={'Customers': 'Customers with this nearest store'})
+    fig.update_layout(title='Distance of catchment customers to their nearest store')
+    return fig
+
+
+def build_live_store_figure(store_ids, counts):
+    # Eine Spur pro Store, y-Index = Stunde, damit Änderungen gezielt ersetzt werden können
+    hourly = {store_id: [0] * 24 for store_id in store_ids}
+    for (store_id, hour), count in counts.items():
+        hourly[store_id][hour] = count
+    frame = pd.DataFrame([(store_id, hour, orders[hour]) for store_id, orders in hourly.items() for hour in range(24)],
+                         columns=['Store ID', 'Hour', 'Orders'])
+    fig = px.bar(frame, x='Hour', y='Orders', color='Store ID', barmode='stack',
+                 category_orders={'Store ID': list(store_ids)})
+    fig.update_layout(title='Orders per hour today (live)')
+    return fig
+
+
+clientside_callback(
+    ClientsideFunction(namespace='live', function_name='toggleInterval'),
+    Output('store-live-interval', 'disabled'),
+    Input('store-live-toggle', 'value')
+)
+
+
+@callback(
+    Output('store-live-graph', 'figure'),
+    Output('store-live-version', 'data'),
+    Input('store-live-interval', 'n_intervals'),
+    Input('store-live-toggle', 'value'),
+    Input('city-dropdown', 'value'),
+    State('store-live-version', 'data'),
+    prevent_initial_call=True
+)
+def update_live_store_graph(n_intervals, live, selected_cities, state):
+    if not live or not selected_cities:
+        raise PreventUpdate
+    store_data = warmup.require('stores.store_data')
+    store_ids = store_data.loc[store_data['City'].isin(selected_cities), 'Store ID'].tolist()
+
+    version = state['version'] if state and state['stores'] == store_ids else None
+    version, changes = live_counters.changes_since(version, set(store_ids))
+    if changes is None:
+        # Erster Abruf, andere Städte oder neue Epoche: ganzer Tag aus den Zählern im Speicher
+        version, counts = live_counters.snapshot(set(store_ids))
+        return build_live_store_figure(store_ids, counts), {'version': version, 'stores': store_ids}
+    if not changes:
+        raise PreventUpdate
+    # Nur geänderte Balken senden, als absolute Werte
+    trace_index = {store_id: i for i, store_id in enumerate(store_ids)}
+    patched = Patch()
+    for (store_id, hour), count in changes.items():
+        patched['data'][trace_index[store_id]]['y'][hour] = count
+    return patched, {'version': version, 'stores': store_ids}
+
+
+@callback(
+    Output('store-info-boxes', 'children'),
+    [Input('date-picker-range', 'start_date'),
      Input('date-picker-range', 'end_date'),
      Input('city-dropdown', 'value'),
-     Input('sales-bar-chart-orders', 'clickData'),
-     Input('sales-bar-chart-customers', 'clickData')]
+     Input('top-pizza-metric', 'value'),
+     Input('top-pizza-count', 'value')],
+    State(TAB_STORE, 'data')
 )
-def update_store_sales(map_click, start_date, end_date, selected_cities, click_orders, click_customers):
-    ctx = callback_context
-    triggered = ctx.triggered[0]['prop_id']
-
-    if triggered == 'store-map.clickData':
-        selected_store = map_click['points'][0]['hovertext']
-        selected_city = store_data[store_data['Store ID'] == selected_store]['City'].values[0]
-        if selected_cities is None:
-            selected_cities = [selected_city]
-        elif selected_city not in selected_cities:
-            selected_cities.append(selected_city)
-
+@cancellable
+def update_store_sales(start_date, end_date, selected_cities, top_metric, top_n):
     if selected_cities is None or not selected_cities:
-        return selected_cities, {}, {}, None, []
+        return []
 
+    store_data = warmup.require('stores.store_data')
     filtered_store_data = store_data[store_data['City'].isin(selected_cities)]
 
-    store_ids = filtered_store_data['Store ID'].tolist()
-
     # Convert store_ids list to tuple for caching
-    store_ids_tuple = tuple(store_ids)
-
-    # Fetch sales data for the selected date range
-    sales_data = get_sales_data(store_ids_tuple, start_date, end_date)
-
-    if sales_data.empty:
-        sales_by_period_orders = pd.DataFrame(columns=['Day', 'City', 'Sales Count'])
-        sales_by_period_customers = pd.DataFrame(columns=['Day', 'City', 'Customer Count'])
-        bar_fig_orders = px.bar(sales_by_period_orders, x='Day', y='Sales Count', color='City',
-                                title='Number of Orders Over Time', barmode='group')
-        bar_fig_customers = px.bar(sales_by_period_customers, x='Day', y='Customer Count', color='City',
-                                   title='Number of Customers Over Time', barmode='group')
-        store_info_boxes = [html.P("No data available.")]
-    else:
-        # Check if zooming to days is required
-        if click_orders:
-            clicked_month = click_orders['points'][0]['x']
-            start_date = pd.to_datetime(clicked_month).to_period('M').start_time
-            end_date = pd.to_datetime(clicked_month).to_period('M').end_time
-            sales_data = get_sales_data(store_ids_tuple, start_date, end_date)
-            zoom_in = True
-        else:
-            zoom_in = False
-
-        # Aggregate sales data by period
-        if zoom_in:
-            sales_data['Day'] = pd.to_datetime(sales_data['Order Date']).dt.to_period('D')
-            sales_by_period_orders = sales_data.groupby(['Day', 'City'])['Sales Count'].sum().reset_index()
-            sales_by_period_customers = sales_data.groupby(['Day', 'City'])['Customer Count'].sum().reset_index()
-            sales_by_period_orders['Day'] = sales_by_period_orders['Day'].astype(str)
-            sales_by_period_customers['Day'] = sales_by_period_customers['Day'].astype(str)
-            bar_fig_orders = px.bar(sales_by_period_orders, x='Day', y='Sales Count', color='City',
-                                    title='Number of Orders Over Time', barmode='group')
-            bar_fig_customers = px.bar(sales_by_period_customers, x='Day', y='Customer Count', color='City',
-                                       title='Number of Customers Over Time', barmode='group')
-        else:
-            sales_data['Month'] = pd.to_datetime(sales_data['Order Date']).dt.to_period('M')
-            sales_by_month_orders = sales_data.groupby(['Month', 'City'])['Sales Count'].sum().reset_index()
-            sales_by_month_customers = sales_data.groupby(['Month', 'City'])['Customer Count'].sum().reset_index()
-            sales_by_month_orders['Month'] = sales_by_month_orders['Month'].astype(str)
-            sales_by_month_customers['Month'] = sales_by_month_customers['Month'].astype(str)
-            bar_fig_orders = px.bar(sales_by_month_orders, x='Month', y='Sales Count', color='City',
-                                    title='Number of Orders Over Time', barmode='group')
-            bar_fig_customers = px.bar(sales_by_month_customers, x='Month', y='Customer Count', color='City',
-                                       title='Number of Customers Over Time', barmode='group')
-
-        bar_fig_orders.update_layout(xaxis={'type': 'category'})
-        bar_fig_customers.update_layout(xaxis={'type': 'category'})
-
-        top_pizzas_data = get_top_pizzas(store_ids_tuple, start_date, end_date)
-
-        # Combine top pizzas and proximity info in a single box for each store
-        store_info_boxes = []
-        for store_id in filtered_store_data['Store ID']:
-            top_pizzas = top_pizzas_data[top_pizzas_data['Store ID'] == store_id]
-            top_pizzas_list = html.Ul(
-                [html.Li(f"{row['Pizza Name']}: {row['Sales Count']} sales") for _, row in top_pizzas.iterrows()])
-
-            store_lat = filtered_store_data[filtered_store_data['Store ID'] == store_id]['Latitude'].values[0]
-            store_lon = filtered_store_data[filtered_store_data['Store ID'] == store_id]['Longitude'].values[0]
-            store_location = (store_lat, store_lon)
-            customer_locations = customer_data[['Latitude', 'Longitude']].apply(tuple, axis=1)
-            customers_within_1_mile = sum(
-                geodesic(store_location, customer_location).miles <= 1 for customer_location in customer_locations)
-            customers_within_10_miles = sum(
-                geodesic(store_location, customer_location).miles <= 10 for customer_location in customer_locations)
-            total_customers = len(customer_data)
-            proximity_info = html.Div([
-                html.P(f"{customers_within_1_mile / total_customers * 100:.2f}% of customers live within 1 mile"),
-                html.P(f"{customers_within_10_miles / total_customers * 100:.2f}% within 10 miles")
+    store_ids_tuple = tuple(filtered_store_data['Store ID'].tolist())
+
+    # Kundendaten und Einzugsgebiete liegen nach dem Warmup schon vor, nur die Top-Pizzen fragen die Datenbank
+    top_n = int(top_n or 3)
+    top_pizzas_data = get_top_pizzas(store_ids_tuple, start_date, end_date, top_n, top_metric or 'count')
+    customer_data = warmup.require('stores.customer_data')
+    catchment_data = warmup.require('stores.catchment')
+    if top_pizzas_data.empty:
+        return [html.P("No data available.")]
+
+    from geopy.distance import geodesic
+
+    top_pizzas_by_store = {store_id: group for store_id, group in top_pizzas_data.groupby('Store ID')}
+    customer_locations = list(zip(customer_data['Latitude'], customer_data['Longitude']))
+    total_customers = len(customer_data)
+    catchment_by_store = catchment_data.set_index('Store ID')
+    catchment_total = catchment_data['Catchment Customers'].sum()
+
+    # Combine top pizzas and proximity info in a single box for each store
+    store_info_boxes = []
+    for store in filtered_store_data.itertuples(index=False):
+        store_id = store[0]
+        top_pizzas = top_pizzas_by_store.get(store_id, top_pizzas_data.iloc[0:0])
+        top_pizzas_list = html.Ul(
+            [html.Li(f"{name}: {count} sales, {revenue:.2f} $") for name, count, revenue in
+             zip(top_pizzas['Pizza Name'], top_pizzas['Sales Count'], top_pizzas['Total Revenue'])])
+
+        store_location = (store.Latitude, store.Longitude)
+        customers_within_1_mile = sum(
+            geodesic(store_location, customer_location).miles <= 1 for customer_location in customer_locations)
+        customers_within_10_miles = sum(
+            geodesic(store_location, customer_location).miles <= 10 for customer_location in customer_locations)
+        proximity_info = html.Div([
+            html.P(f"{customers_within_1_mile / total_customers * 100:.2f}% of customers live within 1 mile"),
+            html.P(f"{customers_within_10_miles / total_customers * 100:.2f}% within 10 miles")
+        ])
+
+        if store_id in catchment_by_store.index:
+            catchment = catchment_by_store.loc[store_id]
+            catchment_info = html.Div([
+                html.P(f"Nearest store for {catchment['Catchment Customers']} customers "
+                       f"({catchment['Catchment Customers'] / catchment_total * 100:.2f}%)"),
+                html.P(f"Median distance {catchment['Median Miles']:.1f} miles, "
+                       f"nearest competitor {catchment['Median Competitor Gap'] or 0:.1f} miles further")
             ])
-
-            store_info_boxes.append(
-                dbc.Card(
-                    dbc.CardBody([
-                        html.H4(f"Store {store_id}"),
-                        html.H5("Top 3 Pizzas:"),
-                        top_pizzas_list,
-                        html.H5("Customer Proximity:"),
-                        proximity_info
-                    ]),
-                    style={"margin-top": "20px"}
-                )
+        else:
+            catchment_info = html.P("No catchment data available.")
+
+        store_info_boxes.append(
+            dbc.Card(
+                dbc.CardBody([
+                    html.H4(f"Store {store_id}"),
+                    html.H5(f"Top {top_n} Pizzas:"),
+                    top_pizzas_list,
+                    html.H5("Customer Proximity:"),
+                    proximity_info,
+                    html.H5("Catchment:"),
+                    catchment_info
+                ]),
+                style={"margin-top": "20px"}
             )
+        )
 
-    return selected_cities, bar_fig_orders, bar_fig_customers, None, store_info_boxes
+    return store_info_boxes
 
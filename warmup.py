@@ -0,0 +1,176 @@
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from flask import jsonify
+
+
+def _process_age():
+    # Sekunden seit Prozessstart (Linux), sonst seit dem Import dieses Moduls
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+# Basis für die Messung des Kaltstarts
+_process_start = time.perf_counter() - _process_age()
+
+_lock = threading.Lock()
+_tasks = {}
+_values = {}
+_events = {}
+# Pro Aufgabe ein Lock, damit gleichzeitige require()-Aufrufe nur einmal laden
+_task_locks = {}
+# Vom Warmup-Thread übernommene Aufgaben; später registrierte laufen beim ersten require()
+_scheduled = set()
+_allow_empty = set()
+_timings = {}
+_errors = {}
+_startup = {}
+_thread = None
+
+
+def register(name, loader, allow_empty=False):
+    # allow_empty: ein leeres Ergebnis ist gültig (z.B. noch nicht berechnete Einzugsgebiete)
+    with _lock:
+        _tasks[name] = loader
+        _events.setdefault(name, threading.Event())
+        _task_locks.setdefault(name, threading.Lock())
+        if allow_empty:
+            _allow_empty.add(name)
+
+
+def _is_empty(value):
+    # Viele Loader fangen ihre Fehler ab und liefern dann leere Frames, [] oder (None, None)
+    if value is None:
+        return True
+    if isinstance(value, pd.DataFrame):
+        return value.empty
+    if isinstance(value, dict):
+        return not value
+    if isinstance(value, (tuple, list)):
+        return all(_is_empty(item) for item in value)
+    return False
+
+
+def _run(name, reload=False):
+    with _task_locks[name]:
+        if name in _values and not reload:
+            # Inzwischen von einem anderen Thread geladen
+            _events[name].set()
+            return
+        started = time.perf_counter()
+        loader = _tasks[name]
+        try:
+            # Gemeinsame Daten laufen außerhalb des Abbruch-Scopes eines Requests (siehe cancellation.py)
+            value = contextvars.Context().run(loader)
+            if name not in _allow_empty and _is_empty(value):
+                # Nicht als Erfolg übernehmen; auch den lru_cache des Loaders leeren, sonst bleibt es leer
+                if hasattr(loader, 'cache_clear'):
+                    loader.cache_clear()
+                raise RuntimeError("leeres Ergebnis")
+            with _lock:
+                _values[name] = value
+                _errors.pop(name, None)
+        except Exception as e:
+            print(f"Fehler beim Aufwärmen von {name}: {e}")
+            with _lock:
+                _errors[name] = str(e)
+        finally:
+            _timings[name] = round(time.perf_counter() - started, 3)
+            _events[name].set()
+
+
+def _run_all():
+    # Unabhängige Aufgaben laufen parallel; abhängige warten per require() auf frühere
+    started = time.perf_counter()
+    with _lock:
+        names = list(_tasks)
+        _scheduled.update(names)
+    with ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix='warmup') as executor:
+        list(executor.map(_run, names))
+    _startup['warmup_seconds'] = round(time.perf_counter() - started, 3)
+    print(f"Warmup abgeschlossen in {_startup['warmup_seconds']:.2f}s")
+
+
+def start():
+    # Startet das Aufwärmen im Hintergrund, der Worker kann sofort Anfragen annehmen
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(target=_run_all, name='warmup', daemon=True)
+    _thread.start()
+    return _thread
+
+
+def get(name, default=None, timeout=0):
+    # Nicht-blockierend (bzw. höchstens timeout Sekunden) für Layouts
+    event = _events.get(name)
+    if event is not None and timeout:
+        event.wait(timeout)
+    return _values.get(name, default)
+
+
+def require(name):
+    # Für Callbacks: wartet auf den Warmup und lädt bei Fehlern (oder für nach dem Start
+    # registrierte Aufgaben) synchron nach
+    with _lock:
+        scheduled = name in _scheduled
+    if scheduled:
+        _events[name].wait()
+    if name not in _values:
+        _run(name)
+    if name not in _values:
+        raise RuntimeError(f"{name} konnte nicht geladen werden: {_errors.get(name)}")
+    return _values[name]
+
+
+def refresh(name):
+    # Lädt neu und tauscht den Wert erst danach aus: Layouts sehen bis dahin den alten Wert statt des
+    # Platzhalters, bei einem Fehler bleibt der alte Wert stehen
+    _run(name, reload=True)
+    return _values.get(name)
+
+
+def invalidate(name=None):
+    # Erzwingt ein Neuladen beim nächsten require(); get() liefert bis dahin den Platzhalter
+    with _lock:
+        for key in ([name] if name else list(_values)):
+            _values.pop(key, None)
+
+
+def mark_ready(label):
+    # Zeit vom Prozessstart bis der Server Anfragen annehmen kann
+    _startup[label] = round(time.perf_counter() - _process_start, 3)
+    print(f"Kaltstart {label}: {_startup[label]:.3f}s (Warmup läuft im Hintergrund)")
+
+
+def status():
+    return {
+        'startup': dict(_startup),
+        'ready': {name: event.is_set() for name, event in _events.items()},
+        'timings': dict(_timings),
+        'errors': dict(_errors),
+    }
+
+
+def init_warmup(server, label):
+    server.add_url_rule('/_warmup', 'warmup_status', lambda: jsonify(status()))
+    # Mit spawn gestartete Kindprozesse (multiprocessing) importieren das Hauptmodul erneut
+    if multiprocessing.parent_process() is not None:
+        return
+    # DASH_WARMUP=0: nichts vorladen (z.B. für die Messung der reinen Importzeit)
+    if os.environ.get('DASH_WARMUP') == '0':
+        return
+    start()
+    mark_ready(label)